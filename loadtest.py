@@ -0,0 +1,464 @@
+"""
+Load-Test-Harness für server.py (lokal, ohne echte APIs).
+
+Startet Fake-Server für api.telegram.org, Dexscreener, GeckoTerminal und die
+OpenAI Chat Completions API, biegt server.py per HTTP_HOST_OVERRIDE darauf um und
+spielt synthetische Update-Streams gegen /telegram ab.
+
+    python loadtest.py                                  # alle Szenarien
+    python loadtest.py --scenario raid --updates 500 --concurrency 16
+    python loadtest.py --latency telegram=40,openai=900 --errors telegram=0.05
+    python loadtest.py --fixtures ./fixtures --dump outbound.jsonl
+
+Pro Szenario: Durchsatz, p50/p99 Webhook-Latenz (Ack), Zeit bis alles abgearbeitet
+ist (Mailboxen, geplante Sends, Telegram-Queue) und Outbound-Calls pro Fake-Host.
+
+--fixtures DIR: echte, aufgezeichnete Antworten als JSON (telegram_send.json,
+dexscreener_pairs.json, gecko_pool.json, gecko_trades.json, openai_chat.json)
+ersetzen die eingebauten Beispiel-Payloads.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# =========================
+# FAKE UPSTREAMS
+# =========================
+
+SERVICES = ("telegram", "dexscreener", "gecko", "openai")
+
+DEFAULT_PAYLOADS = {
+    "telegram_send": {
+        "ok": True,
+        "result": {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": 0, "type": "supergroup"},
+            "text": "",
+            "photo": [
+                {"file_id": "AgACAgQAAxkDAAIBsmZfake-small", "width": 90, "height": 90},
+                {"file_id": "AgACAgQAAxkDAAIBsmZfake-large", "width": 512, "height": 512},
+            ],
+        },
+    },
+    "dexscreener_pairs": {
+        "schemaVersion": "1.0.0",
+        "pairs": [{
+            "chainId": "polygon",
+            "dexId": "sushiswap",
+            "pairAddress": "",
+            "priceUsd": "0.00000041",
+            "priceNative": "0.0000018",
+            "fdv": 172000,
+            "marketCap": 172000,
+            "volume": {"h24": 2310.5, "h6": 410.2, "h1": 35.1, "m5": 0},
+            "priceChange": {"h24": -3.4, "h6": 1.2, "h1": 0.1, "m5": 0},
+            "liquidity": {"usd": 41250.7, "base": 5.1e10, "quote": 9100.0},
+        }],
+    },
+    "gecko_pool": {
+        "data": {
+            "id": "polygon_pos_0x0",
+            "type": "pool",
+            "attributes": {
+                "base_token_price_usd": "0.000000409",
+                "fdv_usd": "171500",
+                "reserve_in_usd": "41180.2",
+                "volume_usd": {"h24": "2298.1"},
+                "price_change_percentage": {"h24": "-3.5"},
+            },
+        },
+    },
+    "gecko_trades": {"data": []},
+    "openai_chat": {
+        "id": "chatcmpl-loadtest",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "TBP is live on Polygon, 0% tax, LP burned. 🐸"},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 900, "completion_tokens": 20, "total_tokens": 920},
+    },
+}
+
+
+class FakeUpstream:
+    """One local HTTP server standing in for an external API."""
+
+    def __init__(self, name: str, payloads: dict, latency_ms: float = 0.0, error_rate: float = 0.0, dump=None):
+        self.name = name
+        self.payloads = payloads
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.dump = dump
+        self.token_delay = 0.05         # Streaming: Abstand zwischen Tokens
+        self.calls = Counter()
+        self.errors = 0
+        self.lock = threading.Lock()
+
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _serve(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(n) if n else b""
+                if upstream.name == "openai" and b'"stream":true' in body.replace(b" ", b""):
+                    return self._stream(body)
+                code, data = upstream.respond(self.command, self.path, body)
+                raw = json.dumps(data).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _stream(self, body):
+                # SSE wie die echte API: ein chunk pro Wort, Latenz bis zum ersten Token
+                code, data = upstream.respond(self.command, self.path, body)
+                if code != 200:
+                    raw = json.dumps(data).encode()
+                    self.send_response(code)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(raw)))
+                    self.end_headers()
+                    self.wfile.write(raw)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                words = data["choices"][0]["message"]["content"].split(" ")
+                for i, w in enumerate(words):
+                    chunk = {"id": data["id"], "object": "chat.completion.chunk", "created": 0, "model": data["model"],
+                             "choices": [{"index": 0, "delta": {"content": w if i == 0 else " " + w}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(upstream.token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            do_GET = _serve
+            do_POST = _serve
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, name=f"fake-{name}", daemon=True).start()
+
+    def _endpoint(self, path: str) -> str:
+        path = path.split("?", 1)[0]
+        if self.name == "telegram":
+            return path.rsplit("/", 1)[-1]                  # sendMessage, sendPhoto, ...
+        if self.name == "dexscreener":
+            return "pairs"
+        if self.name == "gecko":
+            return "trades" if path.endswith("/trades") else "pool"
+        return "chat.completions"
+
+    def respond(self, method: str, path: str, body: bytes):
+        ep = self._endpoint(path)
+        with self.lock:
+            self.calls[ep] += 1
+        if self.dump:
+            self.dump(self.name, method, path, body)
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.7, 1.3))
+
+        if self.error_rate and random.random() < self.error_rate:
+            with self.lock:
+                self.errors += 1
+            if self.name == "telegram":
+                return 429, {"ok": False, "error_code": 429,
+                             "description": "Too Many Requests: retry after 1",
+                             "parameters": {"retry_after": 1}}
+            return 503, {"error": "injected"}
+
+        if self.name == "telegram":
+            data = json.loads(json.dumps(self.payloads["telegram_send"]))
+            with self.lock:
+                data["result"]["message_id"] = sum(self.calls.values())
+            return 200, data
+        if self.name == "dexscreener":
+            # ein Pair pro angefragter Adresse (Batch-Call)
+            addrs = path.split("?", 1)[0].rsplit("/", 1)[-1].split(",")
+            tmpl = self.payloads["dexscreener_pairs"]["pairs"][0]
+            return 200, {"schemaVersion": "1.0.0", "pairs": [dict(tmpl, pairAddress=a) for a in addrs]}
+        if self.name == "gecko":
+            return 200, self.payloads["gecko_trades" if ep == "trades" else "gecko_pool"]
+        return 200, self.payloads["openai_chat"]
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+            self.errors = 0
+
+# =========================
+# SZENARIEN (synthetische Update-Streams)
+# =========================
+
+QUESTIONS = [
+    "what is tbp?", "how do i buy TBP?", "wie hoch ist die liquidity?", "is the LP burned?",
+    "when base launch?", "what are the TBP-AI NFTs?", "who is the dev?", "is there a tax on tbp?",
+    "wo kann ich tbp kaufen?", "how does the buybot work?", "what is the price now?",
+]
+RAID_LINES = ["TBP 🚀🚀🚀", "LFG TBP army 🐸", "raid time!! tbp to the moon", "🐸🐸🐸", "pump it TBP"]
+SPAM_LINES = [
+    "hello admin, we offer fast-track listing on cmc, pay me for fast listing",
+    "CMC priority listing available, DM me",
+    "we guarantee your coin listing on coingecko within 24h",
+]
+
+_UPDATE_ID = [100000]
+
+
+def _update(chat_id: int, user_id: int, text: str = "", **extra) -> dict:
+    _UPDATE_ID[0] += 1
+    msg = {
+        "message_id": _UPDATE_ID[0],
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "supergroup", "title": "TBP Loadtest"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"},
+    }
+    if text:
+        msg["text"] = text
+    msg.update(extra)
+    return {"update_id": _UPDATE_ID[0], "message": msg}
+
+
+def scenario_raid(n: int):
+    chat = -1001000000001
+    return [_update(chat, 5000 + i % 200, random.choice(RAID_LINES)) for i in range(n)]
+
+
+def scenario_join_wave(n: int):
+    chat = -1001000000002
+    return [
+        _update(chat, 6000 + i, new_chat_members=[{"id": 6000 + i, "is_bot": False,
+                                                    "first_name": f"new{i}", "username": f"new{i}"}])
+        for i in range(n)
+    ]
+
+
+def scenario_spam_wave(n: int):
+    chat = -1001000000003
+    return [_update(chat, 7000 + i, random.choice(SPAM_LINES)) for i in range(n)]
+
+
+def scenario_question_flood(n: int):
+    chats = [-1001000000100 - k for k in range(20)]
+    return [_update(random.choice(chats), 8000 + i, random.choice(QUESTIONS)) for i in range(n)]
+
+
+SCENARIOS = {
+    "raid": scenario_raid,
+    "join_wave": scenario_join_wave,
+    "spam_wave": scenario_spam_wave,
+    "question_flood": scenario_question_flood,
+}
+
+# =========================
+# RUNNER
+# =========================
+
+def _pct(values, p):
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(p / 100.0 * (len(s) - 1))))]
+
+
+def _pending(server) -> int:
+    with server._MAILBOX_LOCK:
+        n = sum(len(b) for b in server._MAILBOXES.values()) + len(server._MAILBOX_ACTIVE)
+    with server._SEND_LOCK:
+        n += sum(len(q) for q in server._CHAT_SENDS.values())
+    with server._COALESCE_LOCK:
+        n += len(server._WELCOME_BUF) + sum(1 for w in server._MOD_WINDOWS.values() if w["count"])
+    for q in list(server._TGQ.values()):
+        n += len(q["heap"]) + len(q["busy"])
+    return n
+
+
+def _wait_drained(server, timeout: float) -> float:
+    t0 = time.time()
+    quiet_since = None
+    while time.time() - t0 < timeout:
+        if _pending(server) == 0:
+            quiet_since = quiet_since or time.time()
+            if time.time() - quiet_since >= 0.5:
+                return quiet_since - t0
+        else:
+            quiet_since = None
+        time.sleep(0.05)
+    return float("nan")
+
+
+def run_scenario(server, fakes: dict, name: str, n: int, concurrency: int, drain_timeout: float) -> dict:
+    for f in fakes.values():
+        f.reset()
+    updates = SCENARIOS[name](n)
+    shed0 = dict(server.llm_admission_stats()["shed"])
+    latencies = []
+    lat_lock = threading.Lock()
+    local = threading.local()
+
+    def post(update):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = server.app.test_client()
+        t = time.perf_counter()
+        r = client.post("/telegram", json=update)
+        dt = (time.perf_counter() - t) * 1000.0
+        with lat_lock:
+            latencies.append(dt)
+        return r.status_code
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        codes = Counter(pool.map(post, updates))
+    ingest_sec = time.perf_counter() - t0
+    drain_sec = _wait_drained(server, drain_timeout)
+    admission = server.llm_admission_stats()
+
+    return {
+        "scenario": name,
+        "updates": n,
+        "http_codes": dict(codes),
+        "ingest_sec": round(ingest_sec, 3),
+        "throughput_ups": round(n / ingest_sec, 1) if ingest_sec else None,
+        "ack_p50_ms": round(_pct(latencies, 50), 2),
+        "ack_p99_ms": round(_pct(latencies, 99), 2),
+        "drain_sec": round(drain_sec, 2),
+        "outbound": {k: dict(f.calls) for k, f in fakes.items() if f.calls},
+        "injected_errors": {k: f.errors for k, f in fakes.items() if f.errors},
+        "llm_shed": {k: v - shed0[k] for k, v in admission["shed"].items() if v > shed0[k]},
+        "llm_wait_ms_max": admission["wait_ms_max"],
+    }
+
+
+def _parse_kv(spec: str, cast=float) -> dict:
+    out = {}
+    for part in filter(None, (spec or "").split(",")):
+        k, _, v = part.partition("=")
+        if k.strip() not in SERVICES:
+            raise SystemExit(f"unknown service '{k}' (use {', '.join(SERVICES)})")
+        out[k.strip()] = cast(v)
+    return out
+
+
+def _load_payloads(fixtures_dir: str) -> dict:
+    payloads = json.loads(json.dumps(DEFAULT_PAYLOADS))
+    if fixtures_dir:
+        for key in payloads:
+            path = os.path.join(fixtures_dir, f"{key}.json")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    payloads[key] = json.load(f)
+                print(f"[LOADTEST] fixture {key} <- {path}")
+    return payloads
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local end-to-end load test for server.py")
+    ap.add_argument("--scenario", choices=sorted(SCENARIOS) + ["all"], default="all")
+    ap.add_argument("--updates", type=int, default=200, help="updates per scenario")
+    ap.add_argument("--concurrency", type=int, default=8, help="parallel webhook clients")
+    ap.add_argument("--latency", default="telegram=30,dexscreener=120,gecko=150,openai=700",
+                    help="per-service latency in ms, e.g. telegram=30,openai=700")
+    ap.add_argument("--errors", default="", help="per-service error rate, e.g. telegram=0.05")
+    ap.add_argument("--fixtures", default="", help="directory with recorded JSON payloads")
+    ap.add_argument("--dump", default="", help="write every outbound request as JSONL")
+    ap.add_argument("--drain-timeout", type=float, default=120.0)
+    ap.add_argument("--stream", action="store_true", help="enable TG_STREAM_REPLIES (streamed completions + edits)")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    latency = _parse_kv(args.latency)
+    errors = _parse_kv(args.errors)
+    payloads = _load_payloads(args.fixtures)
+
+    dump_lock = threading.Lock()
+    dump_f = open(args.dump, "w", encoding="utf-8") if args.dump else None
+
+    def dump(service, method, path, body):
+        # Bot-Token aus dem Pfad entfernen
+        path = re.sub(r"/bot\d+:[^/]+/", "/bot<token>/", path)
+        rec = {"ts": time.time(), "service": service, "method": method, "path": path,
+               "body": body.decode("utf-8", "replace") if body else None}
+        with dump_lock:
+            dump_f.write(json.dumps(rec) + "\n")
+
+    fakes = {
+        name: FakeUpstream(name, payloads, latency.get(name, 0.0), errors.get(name, 0.0),
+                           dump if dump_f else None)
+        for name in SERVICES
+    }
+
+    # server.py liest die Config beim Import -> ENV vorher setzen
+    os.environ.update({
+        "HTTP_HOST_OVERRIDE": json.dumps({
+            "api.telegram.org": fakes["telegram"].url,
+            "api.dexscreener.com": fakes["dexscreener"].url,
+            "api.geckoterminal.com": fakes["gecko"].url,
+            "api.openai.com": fakes["openai"].url,
+        }),
+        "TELEGRAM_BOT_TOKEN": os.environ.get("LOADTEST_TOKEN", "1000001:loadtest-tbp"),
+        "OPENAI_API_KEY": "sk-loadtest",
+        "ADMIN_USER_IDS": "1",          # sonst gilt jeder als Admin -> keine Moderation
+        "TG_INGEST_MODE": "webhook",
+        "TG_STREAM_REPLIES": "1" if args.stream else "0",
+        "TG_ROUTES_FILE": "",
+        "TG_FILE_ID_FILE": "",
+        "TG_OFFSETS_FILE": "",
+        "PRICE_HISTORY_FILE": "",
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import server
+
+    names = sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    results = []
+    for name in names:
+        print(f"[LOADTEST] {name}: {args.updates} updates, concurrency {args.concurrency}")
+        results.append(run_scenario(server, fakes, name, args.updates, args.concurrency, args.drain_timeout))
+
+    if dump_f:
+        dump_f.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(
+            f"\n== {r['scenario']} ==\n"
+            f"  updates      {r['updates']}  (HTTP {r['http_codes']})\n"
+            f"  throughput   {r['throughput_ups']} updates/s  (ingest {r['ingest_sec']}s)\n"
+            f"  webhook ack  p50 {r['ack_p50_ms']} ms  p99 {r['ack_p99_ms']} ms\n"
+            f"  drained in   {r['drain_sec']}s"
+        )
+        for svc, calls in r["outbound"].items():
+            print(f"  {svc:<12} {sum(calls.values()):>5} calls  {calls}")
+        if r["injected_errors"]:
+            print(f"  injected     {r['injected_errors']}")
+        if r["llm_shed"]:
+            print(f"  llm shed     {r['llm_shed']}  (max queue wait {r['llm_wait_ms_max']} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 # server.py — TBP-AI + C-BoostAI unified backend (Web + Telegram) — with AI security filters + BUY BOT
 # -*- coding: utf-8 -*-
 
-import os, re, json, time, threading, random
+import os, re, json, time, threading, random, mmap, asyncio, heapq, itertools, hashlib, unicodedata, logging, queue
+from array import array
+from contextlib import asynccontextmanager, contextmanager
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
-from collections import deque
-import requests
-from flask import Flask, request, jsonify
+from collections import deque, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import httpx
+from urllib.parse import urlsplit
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 
 # =========================
@@ -257,6 +262,17 @@ ILLEGAL_OFFER_PATTERNS = [
 app = Flask(__name__)
 CORS(app)
 
+# Eigener Handler für den "tbp"-Logger (Level über LOG_LEVEL); Root-Logger bleibt
+# unangetastet, damit Importeure (Loadtest, WSGI-Server) ihr eigenes Logging behalten.
+log = logging.getLogger("tbp")
+if not log.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+    log.addHandler(_log_handler)
+log.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+log.propagate = False
+logging.getLogger("httpx").setLevel(logging.WARNING)     # loggt sonst jede URL inkl. Bot-Token
+
 # =========================
 # HELPERS
 # =========================
@@ -291,6 +307,239 @@ def is_admin(user_id) -> bool:
         return str(user_id) in ADMIN_USER_IDS if ADMIN_USER_IDS else True
     except Exception:
         return False
+
+# =========================
+# OUTBOUND I/O ENGINE (asyncio, eigener Event-Loop-Thread)
+# =========================
+
+# Alle HTTP-Calls (Telegram, Dexscreener, GeckoTerminal, OpenAI) laufen als Coroutines
+# auf EINEM Event-Loop-Thread mit einem httpx.AsyncClient pro Host (keep-alive Pool).
+# Sync-Code (Flask-Handler, Background-Loops) nutzt die Bridge run_outbound(),
+# async Code kann outbound_submit() awaiten (asyncio.wrap_future).
+# Policy pro Host: timeout = (connect, read), retries = Connect-Fehler bzw. GET-5xx
+# (POSTs werden nie nach dem Senden wiederholt -> keine doppelten Telegram-Nachrichten).
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "20"))
+
+HTTP_HOST_POLICY = {
+    "api.telegram.org":      {"timeout": (3.05, 10), "retries": 2},
+    "api.dexscreener.com":   {"timeout": (3.05, 8),  "retries": 1},
+    "api.geckoterminal.com": {"timeout": (3.05, 8),  "retries": 1},
+    "api.openai.com":        {"timeout": (5, 60),    "retries": 0},
+}
+HTTP_DEFAULT_POLICY = {"timeout": (3.05, 10), "retries": 1}
+
+# Override per ENV, z.B. HTTP_HOST_POLICY='{"api.telegram.org": {"timeout": [2, 8], "retries": 3}}'
+try:
+    for _host, _pol in json.loads(os.environ.get("HTTP_HOST_POLICY", "") or "{}").items():
+        _p = dict(HTTP_HOST_POLICY.get(_host, HTTP_DEFAULT_POLICY))
+        if "timeout" in _pol:
+            _t = _pol["timeout"]
+            _p["timeout"] = tuple(_t) if isinstance(_t, (list, tuple)) else float(_t)
+        if "retries" in _pol:
+            _p["retries"] = int(_pol["retries"])
+        HTTP_HOST_POLICY[_host] = _p
+except Exception as e:
+    print(f"[HTTP] invalid HTTP_HOST_POLICY: {e}")
+
+# Host -> Base-URL umbiegen (Loadtest/Staging), z.B.
+# HTTP_HOST_OVERRIDE='{"api.telegram.org": "http://127.0.0.1:9001"}'
+try:
+    HTTP_HOST_OVERRIDE = {h: u.rstrip("/") for h, u in json.loads(os.environ.get("HTTP_HOST_OVERRIDE", "") or "{}").items()}
+except Exception as e:
+    HTTP_HOST_OVERRIDE = {}
+    print(f"[HTTP] invalid HTTP_HOST_OVERRIDE: {e}")
+
+_HTTP_LOCK = threading.Lock()
+_OUTBOUND = {
+    "loop": None,
+    "thread": None,
+    "clients": {},              # host -> httpx.AsyncClient (nur im Loop-Thread benutzt)
+    "inflight": 0,
+    "calls": 0,
+}
+
+def http_policy(host: str) -> dict:
+    return HTTP_HOST_POLICY.get(host, HTTP_DEFAULT_POLICY)
+
+def _httpx_timeout(t):
+    connect_t, read_t = t if isinstance(t, tuple) else (t, t)
+    return httpx.Timeout(read_t, connect=connect_t)
+
+def outbound_loop() -> asyncio.AbstractEventLoop:
+    """The shared outbound event loop (started on first use)."""
+    loop = _OUTBOUND["loop"]
+    if loop is not None:
+        return loop
+    with _HTTP_LOCK:
+        if _OUTBOUND["loop"] is None:
+            loop = asyncio.new_event_loop()
+            t = threading.Thread(target=loop.run_forever, name="outbound-io", daemon=True)
+            t.start()
+            _OUTBOUND["thread"] = t
+            _OUTBOUND["loop"] = loop
+    return _OUTBOUND["loop"]
+
+def outbound_submit(coro):
+    """Schedule a coroutine on the outbound loop; returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, outbound_loop())
+
+def run_outbound(coro, timeout: float = None):
+    """Sync bridge: run a coroutine on the outbound loop and block for its result."""
+    if threading.current_thread() is _OUTBOUND["thread"]:
+        coro.close()
+        raise RuntimeError("run_outbound() called from the outbound loop; await the coroutine instead")
+    fut = outbound_submit(coro)
+    try:
+        return fut.result(timeout)
+    except Exception:
+        fut.cancel()
+        raise
+
+def _async_client(host: str) -> httpx.AsyncClient:
+    c = _OUTBOUND["clients"].get(host)
+    if c is None:
+        pol = http_policy(host)
+        c = httpx.AsyncClient(
+            timeout=_httpx_timeout(pol["timeout"]),
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+            transport=httpx.AsyncHTTPTransport(retries=pol["retries"]),
+        )
+        _OUTBOUND["clients"][host] = c
+    return c
+
+async def ahttp_request(method: str, url: str, **kwargs) -> httpx.Response:
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    pol = http_policy(host)
+    if host in HTTP_HOST_OVERRIDE:
+        url = HTTP_HOST_OVERRIDE[host] + parts.path + (f"?{parts.query}" if parts.query else "")
+    if "timeout" in kwargs:
+        kwargs["timeout"] = _httpx_timeout(kwargs["timeout"])
+    client = _async_client(host)
+    _OUTBOUND["inflight"] += 1
+    _OUTBOUND["calls"] += 1
+    try:
+        attempt = 0
+        while True:
+            r = await client.request(method, url, **kwargs)
+            if method != "GET" or r.status_code not in (502, 503, 504) or attempt >= pol["retries"]:
+                return r
+            attempt += 1
+            await asyncio.sleep(0.3 * (2 ** (attempt - 1)))
+    finally:
+        _OUTBOUND["inflight"] -= 1
+
+def _bridge_timeout(url: str, kwargs: dict) -> float:
+    t = kwargs.get("timeout") or http_policy(urlsplit(url).hostname or "")["timeout"]
+    connect_t, read_t = t if isinstance(t, tuple) else (t, t)
+    return (connect_t + read_t) * 2 + 5
+
+def http_get(url: str, **kwargs) -> httpx.Response:
+    return run_outbound(ahttp_request("GET", url, **kwargs), timeout=_bridge_timeout(url, kwargs))
+
+def http_post(url: str, **kwargs) -> httpx.Response:
+    return run_outbound(ahttp_request("POST", url, **kwargs), timeout=_bridge_timeout(url, kwargs))
+
+# =========================
+# SCHEDULER (deadline heap)
+# =========================
+
+# Ein Thread, ein Heap mit Deadlines: Autopost, BuyBot-Ticks pro Token, Idle-Deadlines
+# pro Chat, Market-Refresh. Der Thread schläft bis zur nächsten Deadline und startet
+# nur fällige Tasks (auf einem kleinen Worker-Pool) -> Arbeit pro Tick ~ fällige Tasks.
+# Cancel/Reschedule per Key; alte Heap-Einträge werden lazy verworfen.
+SCHED_WORKERS = int(os.environ.get("SCHED_WORKERS", "4"))
+
+_SCHED_COND = threading.Condition()
+_SCHED_HEAP = []                # [when, seq, key, fn, args, cancelled]
+_SCHED_TASKS = {}               # key -> aktiver Heap-Eintrag
+_SCHED_SEQ = itertools.count()
+_SCHED_POOL = ThreadPoolExecutor(max_workers=SCHED_WORKERS, thread_name_prefix="sched")
+_SCHED_STATS = {"runs": 0, "errors": 0, "lag_ms_last": 0.0, "lag_ms_ewma": 0.0, "lag_ms_max": 0.0}
+
+def sched_at(key, when: float, fn, *args):
+    """Schedule ``fn(*args)`` at epoch ``when``; replaces any pending task with the same key."""
+    _ensure_scheduler()
+    with _SCHED_COND:
+        old = _SCHED_TASKS.get(key)
+        if old is not None:
+            old[5] = True
+        entry = [when, next(_SCHED_SEQ), key, fn, args, False]
+        _SCHED_TASKS[key] = entry
+        heapq.heappush(_SCHED_HEAP, entry)
+        if _SCHED_HEAP[0] is entry:
+            _SCHED_COND.notify()
+
+def sched_in(key, delay: float, fn, *args):
+    sched_at(key, time.time() + max(0.0, delay), fn, *args)
+
+def sched_cancel(key) -> bool:
+    with _SCHED_COND:
+        entry = _SCHED_TASKS.pop(key, None)
+        if entry is None:
+            return False
+        entry[5] = True
+        return True
+
+def sched_pending(key) -> bool:
+    with _SCHED_COND:
+        return key in _SCHED_TASKS
+
+def jittered(seconds: float, jitter: float = 0.2) -> float:
+    return seconds * random.uniform(1.0 - jitter, 1.0 + jitter)
+
+def _run_sched_task(entry):
+    try:
+        entry[3](*entry[4])
+    except Exception as e:
+        _SCHED_STATS["errors"] += 1
+        print(f"[SCHED] task {entry[2]} error: {e}")
+
+def _scheduler_loop():
+    while True:
+        due = []
+        with _SCHED_COND:
+            while True:
+                while _SCHED_HEAP and _SCHED_HEAP[0][5]:
+                    heapq.heappop(_SCHED_HEAP)
+                now = time.time()
+                if _SCHED_HEAP and _SCHED_HEAP[0][0] <= now:
+                    break
+                _SCHED_COND.wait(_SCHED_HEAP[0][0] - now if _SCHED_HEAP else None)
+            while _SCHED_HEAP and _SCHED_HEAP[0][0] <= now:
+                entry = heapq.heappop(_SCHED_HEAP)
+                if entry[5]:
+                    continue
+                if _SCHED_TASKS.get(entry[2]) is entry:
+                    del _SCHED_TASKS[entry[2]]
+                due.append(entry)
+
+        for entry in due:
+            lag_ms = max(0.0, (time.time() - entry[0]) * 1000.0)
+            st = _SCHED_STATS
+            st["runs"] += 1
+            st["lag_ms_last"] = lag_ms
+            st["lag_ms_ewma"] = 0.9 * st["lag_ms_ewma"] + 0.1 * lag_ms
+            st["lag_ms_max"] = max(st["lag_ms_max"], lag_ms)
+            _SCHED_POOL.submit(_run_sched_task, entry)
+
+def _ensure_scheduler():
+    if MEM.get("_scheduler_started"):
+        return
+    with _SCHED_COND:
+        if MEM.get("_scheduler_started"):
+            return
+        threading.Thread(target=_scheduler_loop, name="scheduler", daemon=True).start()
+        MEM["_scheduler_started"] = True
+
+def scheduler_stats() -> dict:
+    with _SCHED_COND:
+        pending = len(_SCHED_TASKS)
+        heap_size = len(_SCHED_HEAP)
+    out = {k: (round(v, 2) if isinstance(v, float) else v) for k, v in _SCHED_STATS.items()}
+    out.update({"pending": pending, "heap_size": heap_size})
+    return out
+
 # =========================
 # SMART INTERJECTION (confirm/correct) + anti-spam
 # =========================
@@ -377,13 +626,13 @@ def maybe_smart_interject(chat_id: int, text: str, lang: str):
         return None
 
     score, kind = score_correct_or_misinfo(text)
-    if score < 3:
+    if score < 3 or llm_shedding(LLM_PRIO_INTERJECT):
         return None
 
     sys = build_smart_interject_prompt(kind, lang) + "\n\n" + TBP_PUBLIC_KB
     q = (text or "").strip()
 
-    raw = call_openai(q, [], mode="tbp", channel="tg")
+    raw = call_openai(q, [], mode="tbp", channel="tg", priority=LLM_PRIO_INTERJECT)
     # call_openai already has KB injected after Patch 2, but we keep it safe by ensuring sys exists:
     # If you want stricter control, we can add a call_openai_with_system() later.
 
@@ -548,122 +797,485 @@ def should_reply(chat_id: int, text: str, is_cboost_chat: bool, replied_to_bot:
 # Telegram send helpers
 # -------------------------
 
+# Routing chat -> Bot: gelernt aus eingehenden Updates (Webhook /telegram/<bot_id>)
+# und aus erfolgreichen Sends; persistiert als JSON (nur Bot-IDs, keine Tokens).
+TG_ROUTES_FILE = os.environ.get("TG_ROUTES_FILE", "tg_routes.json").strip()
+
+_BOT_TOKENS = {t.split(":")[0]: t for t in (TELEGRAM_TOKEN_TBP, TELEGRAM_TOKEN_CBOOST) if t}
+_ROUTES_LOCK = threading.Lock()
+_CHAT_ROUTES = {}               # chat_id -> bot_id
+_ROUTE_STATS = {"learned": 0, "fallbacks": 0, "forgotten": 0}
+
+def _load_routes():
+    if not TG_ROUTES_FILE or not os.path.exists(TG_ROUTES_FILE):
+        return
+    try:
+        with open(TG_ROUTES_FILE, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        _CHAT_ROUTES.update({int(k): str(v) for k, v in raw.items()})
+        print(f"[ROUTES] loaded {len(_CHAT_ROUTES)} chat routes")
+    except Exception as e:
+        print(f"[ROUTES] load failed ({TG_ROUTES_FILE}): {e}")
+
+def _save_routes():
+    with _ROUTES_LOCK:
+        snapshot = {str(k): v for k, v in _CHAT_ROUTES.items()}
+    try:
+        tmp = TG_ROUTES_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, TG_ROUTES_FILE)
+    except Exception as e:
+        print(f"[ROUTES] save failed ({TG_ROUTES_FILE}): {e}")
+
+def _routes_changed():
+    if TG_ROUTES_FILE and not sched_pending(("routes_save",)):
+        sched_in(("routes_save",), 5, _save_routes)
+
+def learn_chat_route(chat_id, token: str):
+    if not chat_id or not token:
+        return
+    bot_id = token.split(":")[0]
+    with _ROUTES_LOCK:
+        if _CHAT_ROUTES.get(chat_id) == bot_id:
+            return
+        _CHAT_ROUTES[chat_id] = bot_id
+        _ROUTE_STATS["learned"] += 1
+    _routes_changed()
+
+def forget_chat_route(chat_id, token: str):
+    with _ROUTES_LOCK:
+        if _CHAT_ROUTES.get(chat_id) != token.split(":")[0]:
+            return
+        del _CHAT_ROUTES[chat_id]
+        _ROUTE_STATS["forgotten"] += 1
+    _routes_changed()
+
 def _choose_token_for_chat(chat_id: int) -> str:
+    token = _BOT_TOKENS.get(_CHAT_ROUTES.get(chat_id))
+    if token:
+        return token
     if CBOOST_CHAT_ID and chat_id == CBOOST_CHAT_ID and TELEGRAM_TOKEN_CBOOST:
         return TELEGRAM_TOKEN_CBOOST
     return TELEGRAM_TOKEN_TBP
 
-def tg_send_any(chat_id, text, reply_to=None, preview=True):
-    tokens = [t for t in (TELEGRAM_TOKEN_TBP, TELEGRAM_TOKEN_CBOOST) if t]
-    for token in tokens:
+_load_routes()
+
+# -------------------------
+# Telegram outbound queue (pro Bot-Token)
+# -------------------------
+
+# Alle Telegram-Calls laufen über eine Queue pro Token, abgearbeitet von einem
+# Dispatcher auf dem Outbound-Loop. Token-Buckets pro Chat (~1 msg/s) und global
+# (~30 msg/s), 429 -> parameters.retry_after wird respektiert und erneut versucht.
+# Priorität: Moderation > direkte Antworten > Buy-Alerts > Idle/Autopost.
+PRIO_MODERATION = 0
+PRIO_REPLY      = 1
+PRIO_ALERT      = 2
+PRIO_BACKGROUND = 3
+
+TG_GLOBAL_RATE  = float(os.environ.get("TG_GLOBAL_RATE", "30"))   # msgs/s pro Bot
+TG_CHAT_RATE    = float(os.environ.get("TG_CHAT_RATE", "1"))      # msgs/s pro Chat
+TG_CHAT_BURST   = float(os.environ.get("TG_CHAT_BURST", "3"))
+TG_QUEUE_MAX    = int(os.environ.get("TG_QUEUE_MAX", "500"))      # pro Token
+TG_MAX_ATTEMPTS = int(os.environ.get("TG_MAX_ATTEMPTS", "4"))
+
+# Methoden, die gegen das Chat-Limit zählen (Chat-Actions/Deletes nur global)
+_TG_CHAT_LIMITED = {"sendMessage", "sendPhoto", "editMessageText"}
+
+_TGQ = {}                       # token -> queue state (nur im Outbound-Loop verändert)
+_TGQ_SEQ = itertools.count()
+_TGQ_STATS = {"enqueued": 0, "sent": 0, "failed": 0, "dropped": 0, "expired": 0, "retried_429": 0}
+
+def _bucket(rate: float, burst: float) -> dict:
+    return {"rate": rate, "burst": burst, "tokens": burst, "ts": time.time()}
+
+def _bucket_wait(b: dict, now: float) -> float:
+    b["tokens"] = min(b["burst"], b["tokens"] + (now - b["ts"]) * b["rate"])
+    b["ts"] = now
+    return 0.0 if b["tokens"] >= 1.0 else (1.0 - b["tokens"]) / b["rate"]
+
+def _tgq_state(token: str) -> dict:
+    q = _TGQ.get(token)
+    if q is None:
+        q = {
+            "heap": [],             # [(priority, seq, item)]
+            "event": asyncio.Event(),
+            "global": _bucket(TG_GLOBAL_RATE, TG_GLOBAL_RATE),
+            "chats": {},            # chat_id -> bucket
+            "chat_paused": {},      # chat_id -> ts (retry_after)
+            "paused_until": 0.0,
+            "busy": set(),          # chats mit Request in flight (Reihenfolge pro Chat)
+        }
+        _TGQ[token] = q
+        asyncio.get_running_loop().create_task(_tgq_dispatch(token))
+    return q
+
+def _tgq_finish(item: dict, result, token: str = None):
+    if not item["fut"].done():
+        item["fut"].set_result(result)
+    ok = bool(result and result.get("ok"))
+    if ok and item.get("on_ok"):
         try:
-            payload = {
-                "chat_id": chat_id,
-                "text": text,
-                "parse_mode": "HTML",
-                "disable_web_page_preview": not preview,
-            }
-            if reply_to:
-                payload["reply_to_message_id"] = reply_to
-            requests.post(
-                f"https://api.telegram.org/bot{token}/sendMessage",
-                json=payload,
-                timeout=10,
-            )
-        except Exception:
+            item["on_ok"](token, result)
+        except Exception as e:
+            print(f"[TG] on_ok error: {e}")
+    if not ok and item.get("on_fail"):
+        try:
+            item["on_fail"](result)
+        except Exception as e:
+            print(f"[TG] on_fail error: {e}")
+
+def _tgq_put(token: str, item: dict, seq: int = None):
+    q = _tgq_state(token)
+    heapq.heappush(q["heap"], (item["priority"], next(_TGQ_SEQ) if seq is None else seq, item))
+    if len(q["heap"]) > TG_QUEUE_MAX:
+        # niedrigste Priorität / neueste zuerst verwerfen
+        worst = max(q["heap"], key=lambda e: (e[0], e[1]))
+        q["heap"].remove(worst)
+        heapq.heapify(q["heap"])
+        _TGQ_STATS["dropped"] += 1
+        _tgq_finish(worst[2], None)
+    q["event"].set()
+
+async def _tgq_dispatch(token: str):
+    q = _TGQ[token]
+    while True:
+        if not q["heap"]:
+            q["event"].clear()
+            await q["event"].wait()
+            continue
+
+        now = time.time()
+        gwait = max(q["paused_until"] - now, _bucket_wait(q["global"], now))
+        if gwait > 0:
+            await asyncio.sleep(gwait)
+            continue
+
+        picked, next_wait = None, None
+        for entry in sorted(q["heap"]):
+            item = entry[2]
+            if item.get("max_age") and now - item["t"] > item["max_age"]:
+                q["heap"].remove(entry)
+                _TGQ_STATS["expired"] += 1
+                _tgq_finish(item, None)
+                continue
+            chat = item["chat_id"]
+            if chat in q["busy"]:
+                continue
+            w = q["chat_paused"].get(chat, 0.0) - now
+            if item["method"] in _TG_CHAT_LIMITED and chat is not None:
+                cb = q["chats"].setdefault(chat, _bucket(TG_CHAT_RATE, TG_CHAT_BURST))
+                w = max(w, _bucket_wait(cb, now))
+            if w <= 0:
+                picked = entry
+                break
+            next_wait = w if next_wait is None else min(next_wait, w)
+        heapq.heapify(q["heap"])
+
+        if picked is None:
+            q["event"].clear()
+            try:
+                await asyncio.wait_for(q["event"].wait(), timeout=next_wait if next_wait is not None else None)
+            except asyncio.TimeoutError:
+                pass
             continue
 
+        q["heap"].remove(picked)
+        heapq.heapify(q["heap"])
+        item = picked[2]
+        q["global"]["tokens"] -= 1.0
+        if item["method"] in _TG_CHAT_LIMITED and item["chat_id"] is not None:
+            q["chats"][item["chat_id"]]["tokens"] -= 1.0
+        if item["chat_id"] is not None:
+            q["busy"].add(item["chat_id"])
+        asyncio.get_running_loop().create_task(_tgq_send(token, picked))
+
+async def _tgq_send(token: str, entry):
+    q = _TGQ[token]
+    item = entry[2]
+    chat = item["chat_id"]
+    item["attempts"] += 1
+    try:
+        r = await ahttp_request("POST", f"https://api.telegram.org/bot{token}/{item['method']}", json=item["payload"])
+        try:
+            data = r.json()
+        except Exception:
+            data = {"ok": False, "description": f"HTTP {r.status_code}"}
+
+        if r.status_code == 429:
+            retry_after = float(((data.get("parameters") or {}).get("retry_after")) or 1)
+            until = time.time() + retry_after
+            if chat is not None:
+                q["chat_paused"][chat] = until
+            else:
+                q["paused_until"] = until
+            if item["attempts"] < TG_MAX_ATTEMPTS:
+                _TGQ_STATS["retried_429"] += 1
+                _tgq_put(token, item, seq=entry[1])
+                return
+            _TGQ_STATS["dropped"] += 1
+            data.setdefault("error_code", 429)
+            _tgq_finish(item, data)
+            return
+
+        if data.get("ok"):
+            _TGQ_STATS["sent"] += 1
+            learn_chat_route(chat, token)
+        else:
+            code = data.get("error_code") or r.status_code
+            wrong_bot = code == 403 or (code == 400 and "chat not found" in str(data.get("description", "")).lower())
+            if chat is not None and wrong_bot:
+                forget_chat_route(chat, token)
+                if item.get("fallbacks"):
+                    _ROUTE_STATS["fallbacks"] += 1
+                    item["attempts"] = 0
+                    _tgq_put(item["fallbacks"].pop(0), item)
+                    return
+            _TGQ_STATS["failed"] += 1
+            print(f"[TG] {item['method']} failed (chat {chat}): {data.get('description')}")
+        _tgq_finish(item, data, token)
+    except Exception as e:
+        # nur Fehler vor dem Senden wiederholen; ein Read-Timeout kann schon zugestellt sein
+        pre_send = isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+        if pre_send and item["attempts"] < 2:
+            _tgq_put(token, item, seq=entry[1])
+            return
+        _TGQ_STATS["failed"] += 1
+        print(f"[TG] {item['method']} error (chat {chat}): {e}")
+        _tgq_finish(item, None)
+    finally:
+        q["busy"].discard(chat)
+        q["event"].set()
+
+def tg_call(token: str, method: str, payload: dict, priority: int = PRIO_REPLY,
+            on_fail=None, on_ok=None, max_age: float = None) -> Future:
+    """Enqueue a Telegram Bot API call; returns a Future with the response JSON (or None).
+    Callers that don't need the result can ignore it (fire-and-forget). ``on_fail(result)``
+    gets Telegram's error response, or None if the call was dropped, expired or errored."""
+    item = {
+        "method": method,
+        "payload": payload,
+        "chat_id": payload.get("chat_id"),
+        "priority": priority,
+        "on_fail": on_fail,
+        "on_ok": on_ok,
+        "max_age": max_age,
+        "t": time.time(),
+        "attempts": 0,
+        "fut": Future(),
+        # Chat noch ohne Route -> bei "chat not found"/403 einmal die anderen Bots probieren
+        "fallbacks": [] if payload.get("chat_id") in _CHAT_ROUTES
+                     else [t for t in _BOT_TOKENS.values() if t != token],
+    }
+    _TGQ_STATS["enqueued"] += 1
+    outbound_loop().call_soon_threadsafe(_tgq_put, token, item)
+    return item["fut"]
+
+def tg_queue_stats() -> dict:
+    out = dict(_TGQ_STATS)
+    out["queues"] = {
+        tok.split(":")[0]: {
+            "depth": len(q["heap"]),
+            "in_flight": len(q["busy"]),
+            "paused_chats": sum(1 for v in q["chat_paused"].values() if v > time.time()),
+        }
+        for tok, q in list(_TGQ.items())
+    }
+    return out
+
 def tg_typing(chat_id: int):
     token = _choose_token_for_chat(chat_id)
     if not token:
         return
-    try:
-        requests.post(
-            f"https://api.telegram.org/bot{token}/sendChatAction",
-            json={"chat_id": chat_id, "action": "typing"},
-            timeout=5,
-        )
-    except Exception:
-        pass
+    # Typing ist nach ~5s wertlos -> verfällt in der Queue
+    tg_call(token, "sendChatAction", {"chat_id": chat_id, "action": "typing"}, max_age=4)
+
+# Typing-Manager pro Chat: ein Indikator, solange mindestens eine Antwort in Arbeit ist
+# (Refcount), alle ~4s erneuert und beim Versand der Antwort beendet. Ein noch
+# sichtbarer Indikator (< 4s alt) wird nicht erneut gesendet.
+TYPING_REFRESH_SEC = float(os.environ.get("TYPING_REFRESH_SEC", "4"))
+TYPING_MAX_SEC     = float(os.environ.get("TYPING_MAX_SEC", "60"))     # Sicherung gegen hängende Refs
+
+_TYPING_LOCK = threading.Lock()
+_TYPING = {}                    # chat_id -> {"refs": int, "since": ts, "last_sent": ts}
+_TYPING_STATS = {"started": 0, "sent": 0, "skipped": 0}
+
+def _typing_send(chat_id, st: dict):
+    st["last_sent"] = time.time()
+    _TYPING_STATS["sent"] += 1
+    tg_typing(chat_id)
 
-def tg_send(chat_id, text, reply_to=None, preview=True):
+def typing_start(chat_id):
+    now = time.time()
+    with _TYPING_LOCK:
+        _TYPING_STATS["started"] += 1
+        st = _TYPING.get(chat_id)
+        if st is None:
+            st = _TYPING[chat_id] = {"refs": 0, "since": now, "last_sent": 0.0}
+        if st["refs"] <= 0:
+            st["since"] = now
+        st["refs"] += 1
+        if now - st["last_sent"] < TYPING_REFRESH_SEC:
+            _TYPING_STATS["skipped"] += 1
+        else:
+            _typing_send(chat_id, st)
+        if not sched_pending(("typing", chat_id)):
+            sched_at(("typing", chat_id), st["last_sent"] + TYPING_REFRESH_SEC, _typing_refresh, chat_id)
+
+def typing_stop(chat_id):
+    with _TYPING_LOCK:
+        st = _TYPING.get(chat_id)
+        if st is None:
+            return
+        st["refs"] -= 1
+        if st["refs"] > 0:
+            return
+        # Eintrag bleibt (last_sent), damit ein direkt folgender Start nicht doppelt sendet
+        st["refs"] = 0
+        sched_cancel(("typing", chat_id))
+
+def _typing_refresh(chat_id):
+    now = time.time()
+    with _TYPING_LOCK:
+        st = _TYPING.get(chat_id)
+        if not st or st["refs"] <= 0 or now - st["since"] > TYPING_MAX_SEC:
+            _TYPING.pop(chat_id, None)
+            return
+        _typing_send(chat_id, st)
+        sched_in(("typing", chat_id), TYPING_REFRESH_SEC, _typing_refresh, chat_id)
+
+def tg_send(chat_id, text, reply_to=None, preview=True, priority=PRIO_REPLY):
     token = _choose_token_for_chat(chat_id)
     if not token:
-        return
-    try:
-        payload = {
-            "chat_id": chat_id,
-            "text": text,
-            "parse_mode": "HTML",
-            "disable_web_page_preview": not preview,
-        }
-        if reply_to:
-            payload["reply_to_message_id"] = reply_to
-        requests.post(
-            f"https://api.telegram.org/bot{token}/sendMessage",
-            json=payload,
-            timeout=10,
-        )
-    except Exception:
-        pass
+        return None
+    payload = {
+        "chat_id": chat_id,
+        "text": text,
+        "parse_mode": "HTML",
+        "disable_web_page_preview": not preview,
+    }
+    if reply_to:
+        payload["reply_to_message_id"] = reply_to
+    return tg_call(token, "sendMessage", payload, priority=priority)
 
-def tg_buttons(chat_id, text, buttons):
+def tg_buttons(chat_id, text, buttons, priority=PRIO_REPLY):
     token = _choose_token_for_chat(chat_id)
     if not token:
-        return
+        return None
     kb = {"inline_keyboard": [[{"text": t, "url": u} for (t, u) in buttons]]}
+    return tg_call(token, "sendMessage", {
+        "chat_id": chat_id,
+        "text": text,
+        "reply_markup": kb,
+        "disable_web_page_preview": True,
+        "parse_mode": "HTML",
+    }, priority=priority)
+
+# file_id-Cache pro (Bot, URL): nach dem ersten sendPhoto schickt Telegram das Bild
+# aus dem eigenen Storage, statt es jedes Mal vom Origin-Host zu laden. Neue URL
+# = neuer Key; ungültige file_ids fliegen beim ersten Fehler raus.
+TG_FILE_ID_FILE       = os.environ.get("TG_FILE_ID_FILE", "tg_file_ids.json").strip()
+TG_PREUPLOAD_CHAT_ID  = int(os.environ.get("TG_PREUPLOAD_CHAT_ID", "0") or "0")
+
+_FILE_IDS = {}                  # "bot_id|url" -> file_id
+_FILE_ID_STATS = {"hits": 0, "misses": 0, "stored": 0, "invalidated": 0}
+
+def _file_id_key(token: str, url: str) -> str:
+    return f"{token.split(':')[0]}|{url}"
+
+def _load_file_ids():
+    if not TG_FILE_ID_FILE or not os.path.exists(TG_FILE_ID_FILE):
+        return
     try:
-        requests.post(
-            f"https://api.telegram.org/bot{token}/sendMessage",
-            json={
-                "chat_id": chat_id,
-                "text": text,
-                "reply_markup": kb,
-                "disable_web_page_preview": True,
-                "parse_mode": "HTML",
-            },
-            timeout=10,
-        )
-    except Exception:
-        pass
+        with open(TG_FILE_ID_FILE, "r", encoding="utf-8") as f:
+            _FILE_IDS.update(json.load(f))
+    except Exception as e:
+        print(f"[TG] file_id cache load failed ({TG_FILE_ID_FILE}): {e}")
+
+def _save_file_ids():
+    try:
+        tmp = TG_FILE_ID_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(_FILE_IDS), f)
+        os.replace(tmp, TG_FILE_ID_FILE)
+    except Exception as e:
+        print(f"[TG] file_id cache save failed ({TG_FILE_ID_FILE}): {e}")
+
+def _remember_file_id(token: str, url: str, result: dict):
+    photos = ((result or {}).get("result") or {}).get("photo") or []
+    if not token or not photos:
+        return
+    file_id = photos[-1].get("file_id")       # größte Auflösung
+    key = _file_id_key(token, url)
+    if not file_id or _FILE_IDS.get(key) == file_id:
+        return
+    _FILE_IDS[key] = file_id
+    _FILE_ID_STATS["stored"] += 1
+    if TG_FILE_ID_FILE:
+        sched_in(("file_ids_save",), 2, _save_file_ids)
 
-def tg_send_photo(chat_id, photo_url, caption=None, reply_to=None):
+def tg_send_photo(chat_id, photo_url, caption=None, reply_to=None, priority=PRIO_REPLY):
     token = _choose_token_for_chat(chat_id)
     if not token or not photo_url:
         if caption:
-            tg_send(chat_id, caption, reply_to=reply_to, preview=True)
+            return tg_send(chat_id, caption, reply_to=reply_to, preview=True, priority=priority)
+        return None
+    key = _file_id_key(token, photo_url)
+    file_id = _FILE_IDS.get(key)
+    _FILE_ID_STATS["hits" if file_id else "misses"] += 1
+    payload = {
+        "chat_id": chat_id,
+        "photo": file_id or photo_url,
+        "parse_mode": "HTML",
+    }
+    if caption:
+        payload["caption"] = caption
+    if reply_to:
+        payload["reply_to_message_id"] = reply_to
+
+    def fallback(result):
+        # nur echte Telegram-Fehler; Drops/Expiry/429 sind gewollte Lastabwürfe
+        if not result or result.get("error_code") == 429:
+            return
+        if file_id and _FILE_IDS.pop(key, None):
+            # file_id abgelaufen/fremder Bot -> einmal per URL neu hochladen
+            _FILE_ID_STATS["invalidated"] += 1
+            tg_send_photo(chat_id, photo_url, caption=caption, reply_to=reply_to, priority=priority)
+        elif caption:
+            tg_send(chat_id, caption, reply_to=reply_to, preview=True, priority=priority)
+
+    return tg_call(token, "sendPhoto", payload, priority=priority, on_fail=fallback,
+                   on_ok=lambda tok, res: _remember_file_id(tok, photo_url, res))
+
+def preupload_photos():
+    """Upload the logos once per bot into TG_PREUPLOAD_CHAT_ID to warm the file_id cache."""
+    if not TG_PREUPLOAD_CHAT_ID or MEM.get("_photos_preuploaded"):
         return
-    try:
-        payload = {
-            "chat_id": chat_id,
-            "photo": photo_url,
-            "parse_mode": "HTML",
-        }
-        if caption:
-            payload["caption"] = caption
-        if reply_to:
-            payload["reply_to_message_id"] = reply_to
-        requests.post(
-            f"https://api.telegram.org/bot{token}/sendPhoto",
-            json=payload,
-            timeout=10,
-        )
-    except Exception:
-        if caption:
-            tg_send(chat_id, caption, reply_to=reply_to, preview=True)
+    MEM["_photos_preuploaded"] = True
+    for token in _BOT_TOKENS.values():
+        for url in (TBP_LOGO_URL, CBOOST_LOGO_URL):
+            if not url or _file_id_key(token, url) in _FILE_IDS:
+                continue
+
+            def done(tok, res, url=url):
+                _remember_file_id(tok, url, res)
+                msg_id = (res.get("result") or {}).get("message_id")
+                if msg_id:
+                    tg_call(tok, "deleteMessage", {"chat_id": TG_PREUPLOAD_CHAT_ID, "message_id": msg_id},
+                            priority=PRIO_BACKGROUND)
+
+            tg_call(token, "sendPhoto",
+                    {"chat_id": TG_PREUPLOAD_CHAT_ID, "photo": url, "disable_notification": True},
+                    priority=PRIO_BACKGROUND, on_ok=done)
+
+_load_file_ids()
 
 def tg_delete_message(chat_id, message_id):
     token = _choose_token_for_chat(chat_id)
     if not token:
-        return
-    try:
-        requests.post(
-            f"https://api.telegram.org/bot{token}/deleteMessage",
-            json={"chat_id": chat_id, "message_id": message_id},
-            timeout=10,
-        )
-    except Exception:
-        pass
+        return None
+    return tg_call(token, "deleteMessage", {"chat_id": chat_id, "message_id": message_id}, priority=PRIO_MODERATION)
 
 # -------------------------
 # Moderation: strike system
@@ -683,6 +1295,104 @@ def add_strike(chat_id: int, user_id: int) -> int:
     MEM["strikes"][key] = rec
     return rec["count"]
 
+# -------------------------
+# Coalescing: Welcomes & Moderations-Hinweise pro Chat
+# -------------------------
+
+# Join-Wellen -> eine Willkommensnachricht mit allen neuen Mitgliedern.
+# Moderation: erste Warnung im Fenster sofort, weitere nur gezählt und am Ende
+# als "N messages removed" zusammengefasst (Fenster rollt, solange Spam kommt).
+WELCOME_COALESCE_SEC = float(os.environ.get("WELCOME_COALESCE_SEC", "5"))
+WELCOME_MAX_NAMES    = int(os.environ.get("WELCOME_MAX_NAMES", "15"))
+MOD_NOTICE_WINDOW_SEC = float(os.environ.get("MOD_NOTICE_WINDOW_SEC", "30"))
+
+_COALESCE_LOCK = threading.Lock()
+_WELCOME_BUF = {}      # chat_id -> {"names": [...], "cboost": bool}
+_MOD_WINDOWS = {}      # chat_id -> {"count": int, "reasons": {reason: n}, "lang": str}
+_COALESCE_STATS = {"welcomes_in": 0, "welcomes_out": 0, "warnings_in": 0, "warnings_out": 0}
+
+def welcome_text_for(names: list, is_cboost_chat: bool) -> str:
+    shown = ", ".join(names[:WELCOME_MAX_NAMES])
+    if len(names) > WELCOME_MAX_NAMES:
+        shown += f" +{len(names) - WELCOME_MAX_NAMES} more"
+    if is_cboost_chat:
+        return (
+            f"👋 Welcome {shown} to the official C-Boost community!\n\n"
+            "AI security is ON:\n"
+            "• No paid listing offers\n"
+            "• No promo for other projects\n"
+            "Use /rules for details ⚡"
+        )
+    return (
+        f"👋 Welcome {shown} to the official TurboPepe-AI (TBP) community!\n\n"
+        "AI security is ON:\n"
+        "• No paid listing offers\n"
+        "• No promo for other projects\n\n"
+        "🪙 TBP-AI NFTs LIVE: Gold ($60) / Silver ($30)\n"
+        f"Mint: {LINKS['nfts']}\n\n"
+        "Use /rules for details 🐸"
+    )
+
+def queue_welcome(chat_id: int, display: str, is_cboost_chat: bool):
+    with _COALESCE_LOCK:
+        _COALESCE_STATS["welcomes_in"] += 1
+        buf = _WELCOME_BUF.get(chat_id)
+        if buf is None:
+            buf = _WELCOME_BUF[chat_id] = {"names": [], "cboost": is_cboost_chat}
+            sched_in(("welcome", chat_id), WELCOME_COALESCE_SEC, _flush_welcomes, chat_id)
+        if display not in buf["names"]:
+            buf["names"].append(display)
+
+def _flush_welcomes(chat_id: int):
+    with _COALESCE_LOCK:
+        buf = _WELCOME_BUF.pop(chat_id, None)
+    if not buf or not buf["names"]:
+        return
+    _COALESCE_STATS["welcomes_out"] += 1
+    tg_send(chat_id, welcome_text_for(buf["names"], buf["cboost"]))
+
+def moderation_notice(chat_id: int, lang: str, reason: str, warning: str):
+    """Send a moderation warning, collapsing bursts within MOD_NOTICE_WINDOW_SEC."""
+    with _COALESCE_LOCK:
+        _COALESCE_STATS["warnings_in"] += 1
+        win = _MOD_WINDOWS.get(chat_id)
+        if win is not None:
+            win["count"] += 1
+            win["reasons"][reason] = win["reasons"].get(reason, 0) + 1
+            win["lang"] = lang
+            return
+        _MOD_WINDOWS[chat_id] = {"count": 0, "reasons": {}, "lang": lang}
+        sched_in(("modnotice", chat_id), MOD_NOTICE_WINDOW_SEC, _flush_mod_notice, chat_id)
+    _COALESCE_STATS["warnings_out"] += 1
+    schedule_send(chat_id, 0, tg_send, chat_id, warning, priority=PRIO_MODERATION)
+
+_MOD_REASON_LABELS = {
+    "illegal": ("illegale Angebote", "illegal offers"),
+    "listing": ("Listing-Scams", "listing scams"),
+    "promo":   ("Fremd-Promo", "external promo"),
+}
+
+def _flush_mod_notice(chat_id: int):
+    with _COALESCE_LOCK:
+        win = _MOD_WINDOWS.get(chat_id)
+        if not win or win["count"] == 0:
+            _MOD_WINDOWS.pop(chat_id, None)
+            return
+        # Spam läuft noch -> neues Fenster, damit höchstens 1 Hinweis pro Fenster kommt
+        _MOD_WINDOWS[chat_id] = {"count": 0, "reasons": {}, "lang": win["lang"]}
+        sched_in(("modnotice", chat_id), MOD_NOTICE_WINDOW_SEC, _flush_mod_notice, chat_id)
+
+    lang = win["lang"]
+    parts = ", ".join(
+        f"{n}× {say(lang, *_MOD_REASON_LABELS.get(r, (r, r)))}"
+        for r, n in sorted(win["reasons"].items(), key=lambda kv: -kv[1])
+    )
+    _COALESCE_STATS["warnings_out"] += 1
+    schedule_send(chat_id, 0, tg_send, chat_id, say(lang,
+        f"🛡 {win['count']} weitere Nachrichten entfernt ({parts}).",
+        f"🛡 {win['count']} more messages removed ({parts})."
+    ), priority=PRIO_MODERATION)
+
 # -------------------------
 # Scam / Promo / Illegale Angebote Detection
 # -------------------------
@@ -713,101 +1423,424 @@ def is_illegal_offer(text: str) -> bool:
     return False
 
 # =========================
-# MARKET DATA (TBP)
+# MARKET SNAPSHOT (Dexscreener, shared cache)
 # =========================
 
-def get_live_price():
-    try:
-        r = requests.get(
-            f"https://api.geckoterminal.com/api/v2/networks/polygon_pos/pools/{TBP_PAIR}",
-            timeout=6
-        )
-        r.raise_for_status()
-        j = r.json()
-        attrs = j.get("data", {}).get("attributes", {})
-        v = attrs.get("base_token_price_usd")
-        if v not in (None, "", "null"):
-            p = float(v)
-            if p > 0:
-                return p
-    except Exception:
-        pass
-    try:
-        r = requests.get(
-            f"https://api.dexscreener.com/latest/dex/pairs/polygon/{TBP_PAIR}",
-            timeout=6
-        )
-        r.raise_for_status()
-        j = r.json()
-        pair = j.get("pair") or (j.get("pairs") or [{}])[0]
-        v = pair.get("priceUsd")
-        if v not in (None, "", "null"):
-            p = float(v)
-            if p > 0:
-                return p
-    except Exception:
-        pass
+# Ein Dexscreener-Call füllt alle Felder (Preis, MC, Volumen, Liquidität, 24h).
+# Snapshots werden pro Pair TTL-gecacht; parallele Misses teilen sich einen Fetch.
+# Ein Background-Refresher hält TBP + C-Boost warm, Handler lesen nur aus dem Speicher.
+# Alle konfigurierten Pairs (TBP, C-Boost, TOKEN_BUYBOT) gehen in EINEN Dexscreener-Call.
+MARKET_CACHE_TTL_SEC   = float(os.environ.get("MARKET_CACHE_TTL_SEC", "20"))
+MARKET_REFRESH_SEC     = float(os.environ.get("MARKET_REFRESH_SEC", "15"))     # 0 = Refresher aus
+MARKET_STALE_AFTER_SEC = float(os.environ.get("MARKET_STALE_AFTER_SEC", "90"))
+MARKET_STALE_MAX_SEC   = float(os.environ.get("MARKET_STALE_MAX_SEC", "900"))  # danach kein Wert mehr
+
+_MARKET_LOCK     = threading.Lock()
+_MARKET_CACHE    = {}           # pair (lower) -> snapshot dict
+_MARKET_INFLIGHT = {}           # pair (lower) -> {"event": Event, "result": {pair: snapshot}}
+
+DEXSCREENER_BATCH_MAX = 30      # Dexscreener akzeptiert bis zu 30 Pair-Adressen pro Call
+
+def _parse_dexscreener_pair(pair: dict) -> dict:
+    """Normalize one Dexscreener pair object (schema-tolerant) into a snapshot dict."""
+    pair = pair or {}
+
+    # price change: Dexscreener commonly uses priceChange.h24
+    pc = pair.get("priceChange") or {}
+    change_24h = _safe_float(pair.get("priceChange24h"))  # legacy
+    if change_24h is None:
+        change_24h = _safe_float(pc.get("h24") or pc.get("24h"))
+
+    # volume: volume.h24 is typical
+    vol_obj = pair.get("volume") or {}
+    volume_24h = _safe_float(vol_obj.get("h24") or pair.get("volume24h") or vol_obj.get("24h"))
+
+    liq_obj = pair.get("liquidity") or {}
+    liquidity_usd = _safe_float(liq_obj.get("usd") or liq_obj.get("USD") or pair.get("liquidityUsd"))
+
+    return {
+        "price": _safe_float(pair.get("priceUsd")),
+        "market_cap": _safe_float(pair.get("marketCap") or pair.get("fdv") or pair.get("fdvUsd")),
+        "fdv": _safe_float(pair.get("fdv") or pair.get("fdvUsd")),
+        "volume_24h": volume_24h,
+        "liquidity_usd": liquidity_usd,
+        "change_24h": change_24h,
+    }
+
+def _fetch_market_batch(pair_addresses):
+    """Fetch several Polygon pairs with one Dexscreener call per 30 addresses.
+    Returns {pair_lower: snapshot} for every pair found in the response.
+    """
+    out = {}
+    pairs = list(pair_addresses)
+    for i in range(0, len(pairs), DEXSCREENER_BATCH_MAX):
+        chunk = pairs[i:i + DEXSCREENER_BATCH_MAX]
+        try:
+            r = http_get(f"https://api.dexscreener.com/latest/dex/pairs/polygon/{','.join(chunk)}")
+            r.raise_for_status()
+            j = r.json() or {}
+            items = [p for p in (j.get("pairs") or [j.get("pair")]) if p]
+            by_addr = {(p.get("pairAddress") or "").lower(): p for p in items}
+            now = time.time()
+            for addr in chunk:
+                pair = by_addr.get(addr.lower())
+                if pair is None and len(chunk) == 1 and len(items) == 1:
+                    pair = items[0]
+                if not pair:
+                    continue
+                snap = _parse_dexscreener_pair(pair)
+                snap["pair"] = addr
+                snap["ts"] = now
+                out[addr.lower()] = snap
+        except Exception as e:
+            print(f"[MARKET] Dexscreener error for {len(chunk)} pair(s): {e}")
+    return out
+
+def _snapshot_view(snap: dict) -> dict:
+    """Copy of a cached snapshot with as-of timestamp and staleness flag."""
+    out = dict(snap)
+    age = time.time() - snap["ts"]
+    out["as_of"] = datetime.utcfromtimestamp(snap["ts"]).isoformat(timespec="seconds") + "Z"
+    out["age_sec"] = round(age, 1)
+    out["stale"] = age > MARKET_STALE_AFTER_SEC
+    return out
+
+def _last_good_snapshot(key: str):
+    with _MARKET_LOCK:
+        snap = _MARKET_CACHE.get(key)
+    if snap and (time.time() - snap["ts"]) < MARKET_STALE_MAX_SEC:
+        return _snapshot_view(snap)
     return None
 
-def get_market_stats():
-    """Return TBP market stats using Dexscreener (schema-tolerant).
-    All numeric fields are returned as floats when possible.
+def market_pairs_to_refresh():
+    """All configured pools (TBP, C-Boost, every TOKEN_BUYBOT entry), deduplicated."""
+    seen, out = set(), []
+    cfg_pools = [c.get("pool") for c in TOKEN_BUYBOT.values()]
+    for p in [TBP_PAIR, CBOOST_PAIR] + cfg_pools:
+        if p and p.lower() not in seen:
+            seen.add(p.lower())
+            out.append(p)
+    return out
+
+def _refresh_market_pairs(pair_addresses, piggyback=()):
+    """Single-flight batch refresh.
+
+    Pairs not already in flight are fetched together in one batched call;
+    pairs another thread is fetching are waited on. ``piggyback`` pairs ride
+    along in the same request if nobody is fetching them, but are never waited on.
+    Returns {pair_lower: snapshot} for the pairs that were fetched successfully.
     """
+    wanted = {p.lower(): p for p in pair_addresses if p}
+    extra = {p.lower(): p for p in piggyback if p and p.lower() not in wanted}
+
+    own, waits = {}, {}
+    with _MARKET_LOCK:
+        for k, p in list(wanted.items()) + list(extra.items()):
+            f = _MARKET_INFLIGHT.get(k)
+            if f is None:
+                own[k] = p
+            elif k in wanted:
+                waits[k] = f
+        flight = None
+        if own:
+            flight = {"event": threading.Event(), "result": {}}
+            for k in own:
+                _MARKET_INFLIGHT[k] = flight
+
+    fetched = {}
+    if flight:
+        try:
+            fetched = _fetch_market_batch(own.values())
+            with _MARKET_LOCK:
+                _MARKET_CACHE.update(fetched)
+            record_price_history(fetched.get(TBP_PAIR.lower()))
+        finally:
+            flight["result"] = fetched
+            with _MARKET_LOCK:
+                for k in own:
+                    _MARKET_INFLIGHT.pop(k, None)
+            flight["event"].set()
+
+    for k, f in waits.items():
+        f["event"].wait(10)
+        snap = f["result"].get(k)
+        if snap:
+            fetched[k] = snap
+    return fetched
+
+def get_market_snapshot(pair_address: str, max_age: float = None):
+    """Return a market snapshot dict for a Polygon pair, or None if unavailable.
+
+    Served from cache while younger than ``max_age`` (default MARKET_CACHE_TTL_SEC).
+    While the background refresher runs, default reads never wait on upstream.
+    A cache miss refreshes all configured pairs in one batched, single-flight call;
+    if the fetch fails, the last good value is served within MARKET_STALE_MAX_SEC.
+    Every snapshot carries "as_of" and "stale".
+    """
+    if not pair_address:
+        return None
+    key = pair_address.lower()
+    ttl = MARKET_CACHE_TTL_SEC if max_age is None else max_age
+
+    with _MARKET_LOCK:
+        snap = _MARKET_CACHE.get(key)
+        age = (time.time() - snap["ts"]) if snap else None
+        if snap and age < ttl:
+            return _snapshot_view(snap)
+        if snap and max_age is None and MEM.get("_market_refresher_started") and age < MARKET_STALE_MAX_SEC:
+            return _snapshot_view(snap)
+
+    fetched = _refresh_market_pairs([pair_address], piggyback=market_pairs_to_refresh())
+    snap = fetched.get(key)
+    return _snapshot_view(snap) if snap else _last_good_snapshot(key)
+
+def _market_refresh_tick():
     try:
-        r = requests.get(
-            f"https://api.dexscreener.com/latest/dex/pairs/polygon/{TBP_PAIR}",
-            timeout=8
-        )
-        r.raise_for_status()
-        j = r.json() or {}
-        pair = j.get("pair") or (j.get("pairs") or [{}])[0] or {}
+        _refresh_market_pairs(market_pairs_to_refresh())
+    except Exception as e:
+        print(f"[MARKET] refresher error: {e}")
+    sched_in(("market",), MARKET_REFRESH_SEC, _market_refresh_tick)
 
-        # price change: Dexscreener commonly uses priceChange.h24
-        pc = pair.get("priceChange") or {}
-        change_24h = _safe_float(pair.get("priceChange24h"))  # legacy
-        if change_24h is None:
-            change_24h = _safe_float(pc.get("h24") or pc.get("24h"))
+def start_market_refresher_background():
+    if MARKET_REFRESH_SEC <= 0:
+        return False
+    sched_in(("market",), 0, _market_refresh_tick)
+    return True
 
-        # volume: volume.h24 is typical
-        vol_obj = pair.get("volume") or {}
-        volume_24h = _safe_float(vol_obj.get("h24") or pair.get("volume24h") or vol_obj.get("24h"))
+def ensure_market_refresher():
+    with _MARKET_LOCK:
+        if MEM.get("_market_refresher_started"):
+            return
+        MEM["_market_refresher_started"] = True
+    if not start_market_refresher_background():
+        MEM["_market_refresher_started"] = False
 
-        liq_obj = pair.get("liquidity") or {}
-        liquidity_usd = _safe_float(liq_obj.get("usd") or liq_obj.get("USD") or pair.get("liquidityUsd"))
+def market_asof_line(data: dict, lang: str = "en") -> str:
+    if not data or not data.get("as_of"):
+        return ""
+    hhmmss = data["as_of"][11:19]
+    line = "🕒 " + say(lang, "Stand", "As of") + f": {hhmmss} UTC"
+    if data.get("stale"):
+        line += say(lang, " ⚠️ (veraltet)", " ⚠️ (stale)")
+    return line
 
-        market_cap = _safe_float(pair.get("marketCap") or pair.get("fdv") or pair.get("fdvUsd"))
+# =========================
+# PRICE PROVIDERS (hedged, circuit breaker, latency scoring)
+# =========================
+
+# Provider werden nach EWMA-Latenz / Erfolgsquote sortiert. Ist der erste langsamer
+# als sein p95, geht ein Hedge-Request an den nächsten; der schnellste Erfolg gewinnt.
+# Nach X Fehlern in Folge wird ein Provider für eine Cool-down-Phase übersprungen.
+PROVIDER_TIMEOUT_SEC       = float(os.environ.get("PROVIDER_TIMEOUT_SEC", "6"))
+PROVIDER_HEDGE_DEFAULT_SEC = float(os.environ.get("PROVIDER_HEDGE_DEFAULT_SEC", "1.5"))
+PROVIDER_HEDGE_MIN_SEC     = 0.2
+PROVIDER_CB_FAILS          = int(os.environ.get("PROVIDER_CB_FAILS", "3"))
+PROVIDER_CB_COOLDOWN_SEC   = float(os.environ.get("PROVIDER_CB_COOLDOWN_SEC", "60"))
+PROVIDER_EWMA_ALPHA        = 0.2
+
+_PROVIDER_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="price")
+_PROVIDER_LOCK = threading.Lock()
+_PROVIDER_HEALTH = {}           # name -> stats dict (see _provider_state)
+
+def _price_from_gecko(pair_address: str):
+    r = http_get(
+        f"https://api.geckoterminal.com/api/v2/networks/polygon_pos/pools/{pair_address}",
+        timeout=PROVIDER_TIMEOUT_SEC
+    )
+    r.raise_for_status()
+    attrs = (r.json() or {}).get("data", {}).get("attributes", {})
+    return _safe_float(attrs.get("base_token_price_usd"))
+
+def _price_from_dexscreener(pair_address: str):
+    # geht über den Snapshot-Cache, damit der Batch-Call gleich alle Pairs mit aktualisiert
+    snap = _refresh_market_pairs([pair_address], piggyback=market_pairs_to_refresh()).get(pair_address.lower())
+    return snap.get("price") if snap else None
+
+PRICE_PROVIDERS = {
+    "gecko": _price_from_gecko,
+    "dexscreener": _price_from_dexscreener,
+}
 
-        return {
-            "change_24h": change_24h,
-            "volume_24h": volume_24h,
-            "liquidity_usd": liquidity_usd,
-            "market_cap": market_cap,
+def _provider_state(name: str) -> dict:
+    st = _PROVIDER_HEALTH.get(name)
+    if st is None:
+        st = {
+            "ewma_ms": None,
+            "success_rate": 1.0,        # EWMA der Erfolge (1 = immer ok)
+            "ok": 0,
+            "fail": 0,
+            "consecutive_fail": 0,
+            "open_until": 0.0,
+            "half_open": False,
+            "lat_ms": deque(maxlen=100),
+            "last_error": None,
         }
+        _PROVIDER_HEALTH[name] = st
+    return st
+
+def _provider_score(name: str) -> float:
+    st = _provider_state(name)
+    ewma = st["ewma_ms"] if st["ewma_ms"] is not None else 500.0
+    return ewma / max(st["success_rate"], 0.05)
+
+def _provider_p95_sec(name: str) -> float:
+    lat = sorted(_provider_state(name)["lat_ms"])
+    if len(lat) < 5:
+        return PROVIDER_HEDGE_DEFAULT_SEC
+    return max(PROVIDER_HEDGE_MIN_SEC, lat[int(0.95 * (len(lat) - 1))] / 1000.0)
+
+def _provider_circuit(st: dict, now: float) -> str:
+    if st["consecutive_fail"] < PROVIDER_CB_FAILS:
+        return "closed"
+    if st["half_open"] or now >= st["open_until"]:
+        return "half_open"
+    return "open"
+
+def _provider_available(name: str) -> bool:
+    """Circuit breaker: closed -> ok; open -> skip until cool-down; then one half-open probe
+    (``half_open`` is set when the probe is actually launched)."""
+    st = _provider_state(name)
+    circuit = _provider_circuit(st, time.time())
+    return circuit == "closed" or (circuit == "half_open" and not st["half_open"])
+
+def _provider_record(name: str, ok: bool, elapsed_ms: float, err=None):
+    with _PROVIDER_LOCK:
+        st = _provider_state(name)
+        a = PROVIDER_EWMA_ALPHA
+        st["success_rate"] = (1 - a) * st["success_rate"] + a * (1.0 if ok else 0.0)
+        st["half_open"] = False
+        if ok:
+            st["ok"] += 1
+            st["consecutive_fail"] = 0
+            st["lat_ms"].append(elapsed_ms)
+            st["ewma_ms"] = elapsed_ms if st["ewma_ms"] is None else (1 - a) * st["ewma_ms"] + a * elapsed_ms
+        else:
+            st["fail"] += 1
+            st["consecutive_fail"] += 1
+            st["last_error"] = str(err)[:200] if err else "no data"
+            if st["consecutive_fail"] >= PROVIDER_CB_FAILS:
+                st["open_until"] = time.time() + PROVIDER_CB_COOLDOWN_SEC
+                print(f"[PRICE] circuit open for {name} ({st['consecutive_fail']} fails)")
+
+def _run_provider(name: str, pair_address: str):
+    t0 = time.time()
+    try:
+        p = PRICE_PROVIDERS[name](pair_address)
+        ok = p is not None and p > 0
+        _provider_record(name, ok, (time.time() - t0) * 1000.0)
+        return p if ok else None
     except Exception as e:
-        print(f"[TBP] get_market_stats error: {e}")
+        _provider_record(name, False, (time.time() - t0) * 1000.0, e)
+        return None
+
+def fetch_price_hedged(pair_address: str = TBP_PAIR):
+    """Best provider first; hedge to the next one if it is slower than its p95
+    or fails. Providers with an open circuit are skipped."""
+    with _PROVIDER_LOCK:
+        ranked = sorted(PRICE_PROVIDERS, key=_provider_score)
+        names = [n for n in ranked if _provider_available(n)]
+    if not names:
+        return None
+
+    deadline = time.time() + PROVIDER_TIMEOUT_SEC + 1
+    pending = {}
+    queue = list(names)
+
+    def launch():
+        while queue:
+            n = queue.pop(0)
+            with _PROVIDER_LOCK:
+                st = _provider_state(n)
+                if st["consecutive_fail"] >= PROVIDER_CB_FAILS:
+                    if st["half_open"]:
+                        continue        # Probe läuft bereits in einem anderen Aufruf
+                    st["half_open"] = True
+            pending[_PROVIDER_POOL.submit(_run_provider, n, pair_address)] = n
+            return n
+        return None
+
+    first = launch()
+    if first is None:
+        return None
+    hedge_after = _provider_p95_sec(first)
+    while pending:
+        timeout = max(0.0, deadline - time.time())
+        if queue:
+            timeout = min(timeout, hedge_after)
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for fut in done:
+            pending.pop(fut, None)
+            p = fut.result()
+            if p is not None:
+                return p
+        if time.time() >= deadline:
+            break
+        if queue and (not done or not pending):
+            # langsamer als p95 (Hedge) oder schneller Fehler -> nächster Provider
+            n = launch()
+            if n:
+                hedge_after = _provider_p95_sec(n)
+    return None
+
+def provider_health() -> dict:
+    now = time.time()
+    out = {}
+    with _PROVIDER_LOCK:
+        for name in PRICE_PROVIDERS:
+            st = _provider_state(name)
+            out[name] = {
+                "ok": st["ok"],
+                "fail": st["fail"],
+                "success_rate": round(st["success_rate"], 3),
+                "ewma_ms": round(st["ewma_ms"], 1) if st["ewma_ms"] is not None else None,
+                "p95_ms": round(_provider_p95_sec(name) * 1000.0, 1),
+                "circuit": _provider_circuit(st, now),
+                "last_error": st["last_error"],
+                "score": round(_provider_score(name), 1),
+            }
+    return out
+
+# =========================
+# MARKET DATA (TBP)
+# =========================
+
+def get_live_price():
+    # warmer Snapshot aus dem Speicher zuerst, sonst Provider-Race
+    snap = _last_good_snapshot(TBP_PAIR.lower()) or {}
+    p = snap.get("price")
+    if p is not None and p > 0 and not snap.get("stale"):
+        return p
+    return fetch_price_hedged(TBP_PAIR)
+
+def get_market_stats():
+    """Return TBP market stats from the shared Dexscreener snapshot.
+    All numeric fields are returned as floats when possible.
+    """
+    snap = get_market_snapshot(TBP_PAIR)
+    if not snap:
         return None
+    return {
+        "change_24h": snap.get("change_24h"),
+        "volume_24h": snap.get("volume_24h"),
+        "liquidity_usd": snap.get("liquidity_usd"),
+        "market_cap": snap.get("market_cap"),
+        "as_of": snap.get("as_of"),
+        "stale": snap.get("stale", False),
+    }
 
 
 def get_tbp_price_and_mc():
-    try:
-        r = requests.get(
-            f"https://api.dexscreener.com/latest/dex/pairs/polygon/{TBP_PAIR}",
-            timeout=6
-        )
-        r.raise_for_status()
-        j = r.json()
-        pair = j.get("pair") or (j.get("pairs") or [{}])[0]
-        price = _safe_float(pair.get("priceUsd"))
-        mc    = _safe_float(pair.get("marketCap") or pair.get("fdv"))
-        return price, mc
-    except Exception:
+    snap = get_market_snapshot(TBP_PAIR)
+    if not snap:
         return None, None
+    return snap.get("price"), snap.get("market_cap")
 
 
 def get_tbp_live_data():
-    """Aggregated TBP live data (best-effort)."""
-    price, mc = get_tbp_price_and_mc()
-    stats = get_market_stats() or {}
+    """Aggregated TBP live data (best-effort, one snapshot)."""
+    snap = get_market_snapshot(TBP_PAIR) or {}
+    price = snap.get("price")
+    mc = snap.get("market_cap")
     # If Dexscreener MC missing, approximate from circ supply (informational only)
     if mc is None and price is not None:
         try:
@@ -816,11 +1849,13 @@ def get_tbp_live_data():
             mc = None
     return {
         "price": price,
-        "market_cap": mc if mc is not None else stats.get("market_cap"),
-        "volume_24h": stats.get("volume_24h"),
-        "liquidity_usd": stats.get("liquidity_usd"),
-        "change_24h": stats.get("change_24h"),
+        "market_cap": mc,
+        "volume_24h": snap.get("volume_24h"),
+        "liquidity_usd": snap.get("liquidity_usd"),
+        "change_24h": snap.get("change_24h"),
         "chart_url": LINKS.get("dexscreener"),
+        "as_of": snap.get("as_of"),
+        "stale": snap.get("stale", False),
     }
 
 
@@ -830,28 +1865,170 @@ def get_tbp_live_data():
 
 def get_cboost_live_data():
     pair = CBOOST_PAIR
+    snap = get_market_snapshot(pair)
+    if not snap:
+        return None
+    return {
+        "price":      snap.get("price"),
+        "market_cap": snap.get("fdv") if snap.get("fdv") is not None else snap.get("market_cap"),
+        "volume_24h": snap.get("volume_24h"),
+        "chart_url":  f"https://dexscreener.com/polygon/{pair}",
+        "as_of":      snap.get("as_of"),
+        "stale":      snap.get("stale", False),
+    }
+
+# =========================
+# PRICE HISTORY (TBP) – ring buffer + mmap tiers
+# =========================
+
+# Jeder TBP-Snapshot landet in einem spaltenweisen Ring (array('d'): ts, price, liq, vol).
+# Zusätzlich 1m/15m/1h Kerzen (close/high/low/liq/vol) in einer memory-mapped Datei,
+# damit Historie einen Restart überlebt. Abfragen laufen nur lokal, ohne Upstream-Call.
+PRICE_HISTORY_FILE    = os.environ.get("PRICE_HISTORY_FILE", "tbp_history.bin").strip()
+PRICE_HISTORY_RAW_MAX = int(os.environ.get("PRICE_HISTORY_RAW_MAX", "4096"))
+
+# name -> (bucket seconds, capacity)
+HISTORY_TIERS = {
+    "1m":  (60,   1440),   # 24h
+    "15m": (900,  672),    # 7d
+    "1h":  (3600, 720),    # 30d
+}
+_TIER_COLS  = ("ts", "close", "high", "low", "liq", "vol")
+_HIST_MAGIC = b"TBPHIST1"
+
+_HIST_LOCK = threading.Lock()
+_HIST_RAW = {
+    "ts":    array("d", [0.0]) * PRICE_HISTORY_RAW_MAX,
+    "price": array("d", [0.0]) * PRICE_HISTORY_RAW_MAX,
+    "liq":   array("d", [0.0]) * PRICE_HISTORY_RAW_MAX,
+    "vol":   array("d", [0.0]) * PRICE_HISTORY_RAW_MAX,
+    "head":  0,
+    "count": 0,
+}
+_HIST_STORE = {}                # "mm", "hdr" (int64 view), tier -> {col: float64 view}
+
+def _history_store():
+    """Open (or create) the memory-mapped tier file; returns {} if unavailable."""
+    if _HIST_STORE or not PRICE_HISTORY_FILE:
+        return _HIST_STORE
+    hdr_size = len(_HIST_MAGIC) + 16 * len(HISTORY_TIERS)
+    size = hdr_size + sum(cap * len(_TIER_COLS) * 8 for _, cap in HISTORY_TIERS.values())
     try:
-        r = requests.get(
-            f"https://api.dexscreener.com/latest/dex/pairs/polygon/{pair}",
-            timeout=6
-        )
-        r.raise_for_status()
-        j = r.json()
-        pair_data = j.get("pair") or (j.get("pairs") or [{}])[0]
-
-        price      = _safe_float(pair_data.get("priceUsd"))
-        mc         = _safe_float(pair_data.get("fdv") or pair_data.get("marketCap"))
-        volume_24h = _safe_float((pair_data.get("volume", {}) or {}).get("h24") or pair_data.get("volume24h"))
-
-        return {
-            "price":      price,
-            "market_cap": mc,
-            "volume_24h": volume_24h,
-            "chart_url":  f"https://dexscreener.com/polygon/{pair}",
-        }
+        fresh = not os.path.exists(PRICE_HISTORY_FILE) or os.path.getsize(PRICE_HISTORY_FILE) != size
+        with open(PRICE_HISTORY_FILE, "r+b" if not fresh else "w+b") as f:
+            if fresh:
+                f.truncate(size)
+            mm = mmap.mmap(f.fileno(), size)
+        if mm[:len(_HIST_MAGIC)] != _HIST_MAGIC:
+            mm[:] = bytes(size)
+            mm[:len(_HIST_MAGIC)] = _HIST_MAGIC
+        view = memoryview(mm)
+        _HIST_STORE["mm"] = mm
+        _HIST_STORE["hdr"] = view[len(_HIST_MAGIC):hdr_size].cast("q")   # [head, count] pro Tier
+        off = hdr_size
+        for name, (_, cap) in HISTORY_TIERS.items():
+            cols = {}
+            for col in _TIER_COLS:
+                cols[col] = view[off:off + cap * 8].cast("d")
+                off += cap * 8
+            _HIST_STORE[name] = cols
     except Exception as e:
-        print(f"[CBOOST] Dexscreener error: {e}")
+        print(f"[HISTORY] mmap unavailable ({PRICE_HISTORY_FILE}): {e}")
+        _HIST_STORE.clear()
+    return _HIST_STORE
+
+def _ring_ordered(col, head: int, count: int, cap: int) -> list:
+    if count < cap:
+        return col[:count].tolist()
+    return col[head:].tolist() + col[:head].tolist()
+
+def _tier_append(name: str, idx: int, ts: float, price: float, liq: float, vol: float):
+    step, cap = HISTORY_TIERS[name]
+    store = _HIST_STORE
+    cols, hdr = store[name], store["hdr"]
+    head, count = hdr[2 * idx], hdr[2 * idx + 1]
+    bucket = (ts // step) * step
+
+    last = (head - 1) % cap
+    if count and cols["ts"][last] == bucket:
+        cols["close"][last] = price
+        cols["high"][last] = max(cols["high"][last], price)
+        cols["low"][last] = min(cols["low"][last], price)
+        cols["liq"][last] = liq
+        cols["vol"][last] = vol
+        return
+
+    cols["ts"][head] = bucket
+    cols["close"][head] = price
+    cols["high"][head] = price
+    cols["low"][head] = price
+    cols["liq"][head] = liq
+    cols["vol"][head] = vol
+    hdr[2 * idx] = (head + 1) % cap
+    hdr[2 * idx + 1] = min(count + 1, cap)
+
+def record_price_history(snap: dict):
+    if not snap or not snap.get("price"):
+        return
+    ts = float(snap["ts"])
+    price = float(snap["price"])
+    liq = float(snap.get("liquidity_usd") or 0.0)
+    vol = float(snap.get("volume_24h") or 0.0)
+
+    with _HIST_LOCK:
+        raw = _HIST_RAW
+        last = (raw["head"] - 1) % PRICE_HISTORY_RAW_MAX
+        if raw["count"] and raw["ts"][last] >= ts:
+            return
+        h = raw["head"]
+        raw["ts"][h], raw["price"][h], raw["liq"][h], raw["vol"][h] = ts, price, liq, vol
+        raw["head"] = (h + 1) % PRICE_HISTORY_RAW_MAX
+        raw["count"] = min(raw["count"] + 1, PRICE_HISTORY_RAW_MAX)
+
+        if _history_store():
+            for idx, name in enumerate(HISTORY_TIERS):
+                _tier_append(name, idx, ts, price, liq, vol)
+
+def history_series(tier: str = "15m", since_ts: float = 0.0) -> dict:
+    """Ordered columns for one tier ("raw", "1m", "15m", "1h") from ``since_ts`` on."""
+    with _HIST_LOCK:
+        if tier == "raw":
+            raw = _HIST_RAW
+            args = (raw["head"], raw["count"], PRICE_HISTORY_RAW_MAX)
+            cols = {c: _ring_ordered(raw[c], *args) for c in ("ts", "price", "liq", "vol")}
+        else:
+            store = _history_store()
+            if tier not in HISTORY_TIERS or not store:
+                return {}
+            idx = list(HISTORY_TIERS).index(tier)
+            args = (store["hdr"][2 * idx], store["hdr"][2 * idx + 1], HISTORY_TIERS[tier][1])
+            cols = {c: _ring_ordered(store[tier][c], *args) for c in _TIER_COLS}
+    i = bisect_left(cols["ts"], since_ts)
+    return {c: v[i:] for c, v in cols.items()}
+
+def _tier_for_window(seconds: float) -> str:
+    for name, (step, cap) in HISTORY_TIERS.items():
+        if step * cap >= seconds + 2 * step:
+            return name
+    return list(HISTORY_TIERS)[-1]
+
+def history_change(seconds: float):
+    """Percent change of the TBP price over ``seconds`` from local history, or None."""
+    now = time.time()
+    s = history_series(_tier_for_window(seconds), now - seconds - 3600)
+    ts, close = s.get("ts") or [], s.get("close") or []
+    if len(ts) < 2:
+        return None
+    i = bisect_right(ts, now - seconds) - 1
+    if i < 0 or not close[i]:
         return None
+    return (close[-1] / close[i] - 1.0) * 100.0
+
+def history_high_low(seconds: float = 86400):
+    s = history_series(_tier_for_window(seconds), time.time() - seconds)
+    if not s.get("ts"):
+        return None, None
+    return max(s["high"]), min(s["low"])
 
 # =========================
 # CONVERSATION MEMORY
@@ -918,7 +2095,9 @@ def should_interject(chat_id: int, is_cboost_chat: bool) -> bool:
     MEM["chat_topic"][chat_id] = common
     return True
 
-def build_chat_context_block(chat_id: int) -> str:
+def build_chat_context_block(chat_id: int, budget_tokens: int = None) -> str:
+    """Last 10 chat lines; with ``budget_tokens`` the newest lines that fit are kept
+    (the oldest one that doesn't fit is truncated, older ones dropped)."""
     ensure_chat_mem(chat_id)
     lines = list(MEM["chat_mem"][chat_id])[-10:]
     out = []
@@ -926,7 +2105,9 @@ def build_chat_context_block(chat_id: int) -> str:
         nm = x.get("name") or "user"
         tx = (x.get("text") or "").replace("\n", " ")
         out.append(f"{nm}: {tx}")
-    return "\n".join(out)
+    if budget_tokens is None:
+        return "\n".join(out)
+    return "\n".join(fit_lines_to_budget(out, [chat_line_tokens(x) for x in lines], budget_tokens))
 
 def note_user(chat_id: int, user_id: int, tag: str):
     key = (chat_id, user_id)
@@ -1143,10 +2324,334 @@ That’s what drives long-term value."""
 # OPENAI (FIXED: web vs telegram + context is used)
 # =========================
 
-def _build_messages_from_ctx(system_msg: str, question: str, ctx_list):
+# Ein AsyncOpenAI-Client für den ganzen Prozess; max. OPENAI_MAX_CONCURRENCY Completions
+# gleichzeitig (Semaphore im Outbound-Loop), eigene Retries mit Jitter auf 429/5xx/Timeouts
+# (SDK-Retries aus), harte Deadline pro Aufruf inkl. Wartezeit.
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "4"))
+OPENAI_MAX_RETRIES     = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+OPENAI_DEADLINE_SEC    = float(os.environ.get("OPENAI_DEADLINE_SEC", "90"))
+
+_OPENAI_CLIENT = None
+_OPENAI_SEM = None
+_OPENAI_STATS = {"calls": 0, "retries": 0, "errors": 0, "inflight": 0, "waiting": 0,
+                 "latency_ms_ewma": None, "prompt_tokens_ewma": None, "cached_tokens_ewma": None}
+
+def _ewma_stat(name: str, value, alpha: float = 0.1):
+    if value is None:
+        return
+    prev = _OPENAI_STATS[name]
+    _OPENAI_STATS[name] = round(value if prev is None else prev + alpha * (value - prev), 1)
+
+def _note_openai_usage(usage, t0: float):
+    _ewma_stat("latency_ms_ewma", (time.time() - t0) * 1000)
+    if usage is not None:
+        _ewma_stat("prompt_tokens_ewma", getattr(usage, "prompt_tokens", None))
+        details = getattr(usage, "prompt_tokens_details", None)
+        _ewma_stat("cached_tokens_ewma", getattr(details, "cached_tokens", None) if details else None)
+
+def _openai_client():
+    """Long-lived AsyncOpenAI client on the outbound loop (pooled keep-alive connections)."""
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        with _HTTP_LOCK:
+            if _OPENAI_CLIENT is None:
+                from openai import AsyncOpenAI
+                base = HTTP_HOST_OVERRIDE.get("api.openai.com")
+                _OPENAI_CLIENT = AsyncOpenAI(
+                    api_key=OPENAI_API_KEY,
+                    base_url=f"{base}/v1" if base else None,
+                    timeout=_httpx_timeout(http_policy("api.openai.com")["timeout"]),
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(
+                        timeout=_httpx_timeout(http_policy("api.openai.com")["timeout"]),
+                        limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+                    ),
+                )
+    return _OPENAI_CLIENT
+
+def _openai_retry_after(e) -> float:
+    try:
+        return float(e.response.headers.get("retry-after"))
+    except Exception:
+        return 0.0
+
+@asynccontextmanager
+async def _openai_slot():
+    global _OPENAI_SEM
+    if _OPENAI_SEM is None:
+        _OPENAI_SEM = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+    _OPENAI_STATS["waiting"] += 1
+    try:
+        await _OPENAI_SEM.acquire()
+    finally:
+        _OPENAI_STATS["waiting"] -= 1
+    _OPENAI_STATS["inflight"] += 1
+    try:
+        yield
+    finally:
+        _OPENAI_STATS["inflight"] -= 1
+        _OPENAI_SEM.release()
+
+async def _openai_create(**kwargs):
+    """chat.completions.create with jittered retries on 429/5xx/connection errors."""
+    import openai
+    client = _openai_client()
+    attempt = 0
+    while True:
+        _OPENAI_STATS["calls"] += 1
+        try:
+            return await client.chat.completions.create(**kwargs)
+        except (openai.APIStatusError, openai.APIConnectionError) as e:
+            status = getattr(e, "status_code", None)
+            retriable = status is None or status == 429 or status >= 500
+            if not retriable or attempt >= OPENAI_MAX_RETRIES:
+                raise
+            attempt += 1
+            _OPENAI_STATS["retries"] += 1
+            delay = max(_openai_retry_after(e), min(8.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5))
+            log.warning("[OPENAI] %s (status %s), retry %d/%d in %.1fs",
+                        type(e).__name__, status, attempt, OPENAI_MAX_RETRIES, delay)
+            await asyncio.sleep(delay)
+
+async def _openai_complete(**kwargs):
+    """Completion with concurrency cap and retries (runs on the outbound loop)."""
+    async with _openai_slot():
+        t0 = time.time()
+        resp = await _openai_create(**kwargs)
+        _note_openai_usage(getattr(resp, "usage", None), t0)
+        return resp
+
+async def _openai_stream(on_text, **kwargs) -> str:
+    """Streamed completion; ``on_text(text_so_far)`` is called on the loop for every delta.
+    Retries only happen before the first token."""
+    async with _openai_slot():
+        t0 = time.time()
+        stream = await _openai_create(stream=True, stream_options={"include_usage": True}, **kwargs)
+        parts, usage = [], None
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_text("".join(parts))
+        _note_openai_usage(usage, t0)
+        return "".join(parts).strip()
+
+# -------------------------
+# LLM-Admission (Prioritäten + Lastabwurf)
+# -------------------------
+
+# Vor jeder Completion: max. LLM_ADMIT_SLOTS gleichzeitig, der Rest wartet in einer
+# begrenzten Queue (niedrigste Klasse zuerst dran). Liegt die (geschätzte) Wartezeit
+# über LLM_QUEUE_SLO_SEC, werden Fragen abgelehnt (-> Canned Answer / keine Antwort),
+# Einwürfe warten nie. Antworten auf Bot-Nachrichten fliegen nur bei voller Queue raus.
+LLM_PRIO_REPLY     = 0          # Antwort auf eine Bot-Nachricht
+LLM_PRIO_QUESTION  = 1          # direkte Frage (Telegram, Website)
+LLM_PRIO_INTERJECT = 2          # Einwürfe (Conversation Watcher, Smart-Interject)
+_LLM_PRIO_NAMES = ("reply", "question", "interject")
+
+LLM_ADMIT_SLOTS        = int(os.environ.get("LLM_ADMIT_SLOTS", str(OPENAI_MAX_CONCURRENCY)))
+LLM_QUEUE_MAX          = int(os.environ.get("LLM_QUEUE_MAX", "24"))
+LLM_QUEUE_SLO_SEC      = float(os.environ.get("LLM_QUEUE_SLO_SEC", "6"))
+LLM_ADMIT_MAX_WAIT_SEC = float(os.environ.get("LLM_ADMIT_MAX_WAIT_SEC", "45"))
+
+_ADMIT_COND = threading.Condition()
+_ADMIT = {"active": 0, "seq": 0}
+_ADMIT_QUEUE = []               # wartende Tickets {"prio", "seq", "t", "state"}
+_ADMIT_STATS = {"admitted": 0, "queued": 0, "evicted": 0, "timeouts": 0,
+                "shed": {n: 0 for n in _LLM_PRIO_NAMES},
+                "wait_ms_ewma": None, "wait_ms_max": 0, "wait_ms_last": None}
+
+def _admit_wait_estimate(priority: int, now: float) -> float:
+    """Expected queue wait (s) for a new call of this class: the longer of the current
+    head-of-line wait and (calls ahead / slots) * completion latency."""
+    ahead = [t for t in _ADMIT_QUEUE if t["prio"] <= priority]
+    if not ahead:
+        return 0.0
+    lat = (_OPENAI_STATS["latency_ms_ewma"] or 0) / 1000.0
+    return max(now - min(t["t"] for t in ahead), (len(ahead) + 1) * lat / max(1, LLM_ADMIT_SLOTS))
+
+def _admit_over_slo(priority: int, now: float) -> bool:
+    # unter _ADMIT_COND, nur wenn alle Slots belegt sind
+    if priority >= LLM_PRIO_INTERJECT:
+        return True
+    return priority >= LLM_PRIO_QUESTION and _admit_wait_estimate(priority, now) > LLM_QUEUE_SLO_SEC
+
+def _admit_note_wait(waited: float):
+    ms = round(waited * 1000)
+    prev = _ADMIT_STATS["wait_ms_ewma"]
+    _ADMIT_STATS["wait_ms_ewma"] = round(ms if prev is None else prev + 0.1 * (ms - prev), 1)
+    _ADMIT_STATS["wait_ms_last"] = ms
+    _ADMIT_STATS["wait_ms_max"] = max(_ADMIT_STATS["wait_ms_max"], ms)
+
+def _admit_shed(priority: int, why: str) -> bool:
+    _ADMIT_STATS["shed"][_LLM_PRIO_NAMES[priority]] += 1
+    log.info("[LLM] shed %s call (%s, queue=%d)", _LLM_PRIO_NAMES[priority], why, len(_ADMIT_QUEUE))
+    return False
+
+def llm_shedding(priority: int) -> bool:
+    """True if a call of this class would be shed right now (cheap pre-check, not binding)."""
+    with _ADMIT_COND:
+        if _ADMIT["active"] < LLM_ADMIT_SLOTS and not _ADMIT_QUEUE:
+            return False
+        return _admit_over_slo(priority, time.time())
+
+def llm_admit(priority: int) -> bool:
+    """Wait for a completion slot. False = shed (caller degrades), True = admitted and
+    the caller must call llm_release() when the completion is done."""
+    now = time.time()
+    with _ADMIT_COND:
+        if _ADMIT["active"] < LLM_ADMIT_SLOTS and not _ADMIT_QUEUE:
+            _ADMIT["active"] += 1
+            _ADMIT_STATS["admitted"] += 1
+            _admit_note_wait(0.0)
+            return True
+        if _admit_over_slo(priority, now):
+            return _admit_shed(priority, "busy" if priority >= LLM_PRIO_INTERJECT else "slo")
+        if len(_ADMIT_QUEUE) >= LLM_QUEUE_MAX:
+            # volle Queue: jüngstes Ticket der niedrigsten Klasse verdrängen, falls niedriger als wir
+            victim = max(_ADMIT_QUEUE, key=lambda t: (t["prio"], t["seq"]))
+            if victim["prio"] <= priority:
+                return _admit_shed(priority, "full")
+            _ADMIT_QUEUE.remove(victim)
+            victim["state"] = "evicted"
+            _ADMIT_STATS["evicted"] += 1
+            _ADMIT_COND.notify_all()
+
+        _ADMIT["seq"] += 1
+        ticket = {"prio": priority, "seq": _ADMIT["seq"], "t": now, "state": "wait"}
+        _ADMIT_QUEUE.append(ticket)
+        _ADMIT_STATS["queued"] += 1
+        # Fragen warten höchstens bis zum SLO, Replies bis LLM_ADMIT_MAX_WAIT_SEC
+        deadline = now + (LLM_QUEUE_SLO_SEC if priority >= LLM_PRIO_QUESTION else LLM_ADMIT_MAX_WAIT_SEC)
+        while ticket["state"] == "wait":
+            left = deadline - time.time()
+            if left <= 0:
+                _ADMIT_QUEUE.remove(ticket)
+                ticket["state"] = "timeout"
+                _ADMIT_STATS["timeouts"] += 1
+                break
+            _ADMIT_COND.wait(left)
+        if ticket["state"] != "go":
+            return _admit_shed(priority, f"{ticket['state']} after {time.time() - now:.1f}s")
+        _ADMIT_STATS["admitted"] += 1
+        _admit_note_wait(time.time() - now)
+        return True
+
+def llm_release():
+    with _ADMIT_COND:
+        _ADMIT["active"] -= 1
+        while _ADMIT_QUEUE and _ADMIT["active"] < LLM_ADMIT_SLOTS:
+            nxt = min(_ADMIT_QUEUE, key=lambda t: (t["prio"], t["seq"]))
+            _ADMIT_QUEUE.remove(nxt)
+            nxt["state"] = "go"
+            _ADMIT["active"] += 1
+        _ADMIT_COND.notify_all()
+
+def llm_admission_stats() -> dict:
+    with _ADMIT_COND:
+        now = time.time()
+        return dict(_ADMIT_STATS, shed=dict(_ADMIT_STATS["shed"]), active=_ADMIT["active"],
+                    slots=LLM_ADMIT_SLOTS, queue_depth=len(_ADMIT_QUEUE),
+                    queue_head_ms=round((now - min(t["t"] for t in _ADMIT_QUEUE)) * 1000) if _ADMIT_QUEUE else 0,
+                    slo_ms=round(LLM_QUEUE_SLO_SEC * 1000))
+
+# -------------------------
+# Prompt-Budget (Tokens)
+# -------------------------
+
+# Kontext wird gegen ein Token-Budget pro Channel gebaut: Tokens pro Zeile werden
+# einmal gezählt (Chat-Zeilen: am Eintrag, Web-Kontext/Prompts: Memo), die ältesten
+# Zeilen fliegen zuerst raus bzw. werden gekürzt. Der System-Prompt steht immer
+# unverändert vorne -> identischer Prefix für Provider-seitiges Prompt-Caching.
+PROMPT_BUDGET_TOKENS = {
+    "tg":  int(os.environ.get("PROMPT_BUDGET_TG", "1800")),
+    "web": int(os.environ.get("PROMPT_BUDGET_WEB", "3200")),
+}
+PROMPT_INSTRUCTION_TOKENS = 200     # feste Anweisungen im Telegram-User-Prompt
+PROMPT_MIN_LINE_TOKENS    = 16      # kürzer lohnt das Anschneiden nicht
+
+try:
+    import tiktoken
+    try:
+        _TOKENIZER = tiktoken.encoding_for_model(OPENAI_MODEL)
+    except KeyError:
+        _TOKENIZER = tiktoken.get_encoding("o200k_base")
+except Exception:
+    _TOKENIZER = None               # Schätzung: ~4 Bytes UTF-8 pro Token
+
+_TOKEN_MEMO = OrderedDict()         # text -> tokens (Prompts, Web-Kontext)
+_TOKEN_MEMO_MAX = 4096
+_PROMPT_STATS = {"lines_dropped": 0, "lines_truncated": 0}
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _TOKENIZER is not None:
+        return len(_TOKENIZER.encode(text, disallowed_special=()))
+    return (len(text.encode("utf-8")) + 3) // 4
+
+def cached_tokens(text: str) -> int:
+    n = _TOKEN_MEMO.get(text)
+    if n is None:
+        n = count_tokens(text)
+        _TOKEN_MEMO[text] = n
+        if len(_TOKEN_MEMO) > _TOKEN_MEMO_MAX:
+            _TOKEN_MEMO.popitem(last=False)
+    return n
+
+def chat_line_tokens(x: dict) -> int:
+    n = x.get("tok")
+    if n is None:
+        n = x["tok"] = count_tokens(f"{x.get('name') or 'user'}: {x.get('text') or ''}") + 1
+    return n
+
+def _truncate_to_tokens(text: str, tokens: int) -> str:
+    if _TOKENIZER is not None:
+        return _TOKENIZER.decode(_TOKENIZER.encode(text, disallowed_special=())[-tokens:])
+    return text.encode("utf-8")[-tokens * 4:].decode("utf-8", "ignore")
+
+def fit_lines_to_budget(lines: list, tokens: list, budget: int) -> list:
+    """Keep the newest lines within ``budget`` tokens (chronological order preserved).
+    The newest line that does not fit is cut to its tail if enough budget is left."""
+    kept, used = [], 0
+    for i in range(len(lines) - 1, -1, -1):
+        if used + tokens[i] <= budget:
+            kept.append(lines[i])
+            used += tokens[i]
+            continue
+        rest = budget - used
+        if rest >= PROMPT_MIN_LINE_TOKENS:
+            # "Name: text" / "You: text" -> Präfix behalten, Ende des Texts behalten
+            head, sep, body = lines[i].partition(": ")
+            if not sep or len(head) > 40:
+                head, sep, body = "", "", lines[i]
+            keep = rest - count_tokens(head + sep) - 1
+            kept.append(f"{head}{sep}…{_truncate_to_tokens(body, max(1, keep))}")
+            _PROMPT_STATS["lines_truncated"] += 1
+            i -= 1
+        _PROMPT_STATS["lines_dropped"] += i + 1
+        break
+    kept.reverse()
+    return kept
+
+def context_budget(channel: str, mode: str, *fixed: str) -> int:
+    """Tokens left for conversation context after system prompt, question and instructions."""
+    used = cached_tokens(system_prompt_for(mode, channel)) + sum(count_tokens(f) for f in fixed)
+    if channel == "tg":
+        used += PROMPT_INSTRUCTION_TOKENS
+    return max(0, PROMPT_BUDGET_TOKENS.get(channel, 2000) - used)
+
+def _build_messages_from_ctx(system_msg: str, question: str, ctx_list, budget_tokens: int = None):
     messages = [{"role": "system", "content": system_msg}]
+    ctx_list = [l for l in (ctx_list or [])[-12:] if isinstance(l, str)]
+    if budget_tokens is not None:
+        ctx_list = fit_lines_to_budget(ctx_list, [cached_tokens(l) for l in ctx_list], budget_tokens)
     try:
-        for line in (ctx_list or [])[-12:]:
+        for line in ctx_list:
             if isinstance(line, str) and line.startswith("You: "):
                 messages.append({"role": "user", "content": line[5:]})
             elif isinstance(line, str) and (line.startswith("TBP: ") or line.startswith("C-Boost: ")):
@@ -1157,15 +2662,202 @@ def _build_messages_from_ctx(system_msg: str, question: str, ctx_list):
     messages.append({"role": "user", "content": question})
     return messages
 
-def call_openai(question: str, context, mode: str = "tbp", channel: str = "tg"):
-    print("DEBUG call_openai: mode =", mode, "channel =", channel)
-    print("DEBUG call_openai: OPENAI_API_KEY set =", bool(OPENAI_API_KEY))
-    print("DEBUG call_openai: OPENAI_MODEL =", OPENAI_MODEL)
+# -------------------------
+# LLM answer cache (normalisierte Frage)
+# -------------------------
 
-    if not OPENAI_API_KEY:
-        print("DEBUG call_openai: NO OPENAI_API_KEY, aborting.")
-        return None
+# Key = normalisierte Frage + mode + channel + Hash(System-Prompt + KB + Modell).
+# Ändert sich Prompt/KB, ändert sich der Hash -> alte Einträge werden nie mehr
+# getroffen und fallen per LRU/TTL raus. Budget in Bytes (UTF-8 der Antworten).
+LLM_CACHE_TTL_SEC   = float(os.environ.get("LLM_CACHE_TTL_SEC", str(6 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+
+_LLM_CACHE_LOCK = threading.Lock()
+_LLM_CACHE = OrderedDict()      # key -> (answer, expires_ts, size)
+_LLM_CACHE_STATE = {"bytes": 0}
+_LLM_CACHE_STATS = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0, "expired": 0}
+
+def normalize_question(q: str) -> str:
+    q = unicodedata.normalize("NFKC", q or "").lower()
+    q = re.sub(r"[^\w\s]", " ", q)          # Satzzeichen, Emojis
+    return re.sub(r"\s+", " ", q).strip()
+
+# Eigenständige Frage? Der Prompt enthält weiterhin den Chat-Kontext, gecacht wird die
+# Antwort aber nur, wenn die Frage sich nicht darauf bezieht: kein Rückbezug
+# (Pronomen, "und ...", "what about ...") und keine gemeinsamen Inhaltswörter mit den
+# Kontextzeilen. Frühere Wiederholungen derselben Frage (samt Bot-Antwort) zählen nicht.
+_FOLLOWUP_RE = re.compile(
+    r"^\s*(and|but|so|also|then|or|what about|how about|und|aber|dann|oder|was ist mit)\b"
+    r"|\b(it|its|that|this|these|those|they|them|their|he|she|him|her|same"
+    r"|es|dies|diese|dieser|dieses|diesen|davon|dazu|darüber|damit|ihn|ihm|ihnen)\b",
+    re.I,
+)
+_CONTENT_WORD_RE = re.compile(r"[a-zäöüß0-9]{3,}")
+_STANDALONE_STOPWORDS = {
+    "the", "and", "are", "you", "how", "why", "who", "can", "for", "not", "but", "any", "has",
+    "had", "get", "all", "our", "out", "one", "now", "yes", "pls", "thx", "hey", "ist", "ich",
+    "der", "die", "das", "und", "wie", "was", "wer", "mit", "für", "von", "den", "dem", "ein",
+    "hat", "man", "tbp", "lol",
+    "what", "when", "where", "which", "with", "about", "does", "have", "there", "your", "from",
+    "will", "would", "could", "should", "than", "just", "like", "know", "tell", "please", "thanks",
+    "explain", "some", "much", "many", "more", "really", "okay", "here", "into", "been", "were",
+    "guys", "hello", "everyone", "good", "right", "wann", "warum", "wieso", "weshalb", "welche",
+    "welcher", "gibt", "kann", "haben", "habe", "sind", "eine", "einen", "einem", "einer", "nicht",
+    "mehr", "auch", "noch", "bitte", "danke", "schon", "jetzt", "hier", "wenn", "sich", "mich",
+    "dich", "euch", "über", "hallo", "leute",
+    "token", "coin", "project", "projekt", "turbopepe", "pepe", "cboost", "boost",
+}
+
+def _content_words(text: str) -> set:
+    return set(_CONTENT_WORD_RE.findall((text or "").lower())) - _STANDALONE_STOPWORDS
+
+def question_is_standalone(question: str, context_lines, answer_prefixes=()) -> bool:
+    """True if the answer to ``question`` does not depend on ``context_lines``
+    ("Name: text"), so it may be served from / stored in the answer cache."""
+    if _FOLLOWUP_RE.search(question or ""):
+        return False
+    words = _content_words(question)
+    if not words:
+        return True
+    norm = normalize_question(question)
+    skip_answer = False
+    for line in context_lines or []:
+        if not isinstance(line, str):
+            continue
+        if skip_answer and line.startswith(tuple(answer_prefixes)):
+            skip_answer = False
+            continue
+        body = line.split(": ", 1)[-1]
+        skip_answer = normalize_question(body) == norm
+        if not skip_answer and _content_words(body) & words:
+            return False
+    return True
+
+def _prompt_version(system_msg: str) -> str:
+    return hashlib.sha1(f"{OPENAI_MODEL}\0{system_msg}\0{TBP_PUBLIC_KB}".encode()).hexdigest()[:16]
+
+def llm_cache_get(key: str):
+    now = time.time()
+    with _LLM_CACHE_LOCK:
+        hit = _LLM_CACHE.get(key)
+        if hit is None:
+            _LLM_CACHE_STATS["misses"] += 1
+            return None
+        answer, expires, size = hit
+        if expires < now:
+            del _LLM_CACHE[key]
+            _LLM_CACHE_STATE["bytes"] -= size
+            _LLM_CACHE_STATS["expired"] += 1
+            _LLM_CACHE_STATS["misses"] += 1
+            return None
+        _LLM_CACHE.move_to_end(key)
+        _LLM_CACHE_STATS["hits"] += 1
+        return answer
+
+def llm_cache_put(key: str, answer: str):
+    size = len(answer.encode("utf-8")) + len(key)
+    if size > LLM_CACHE_MAX_BYTES:
+        return
+    with _LLM_CACHE_LOCK:
+        old = _LLM_CACHE.pop(key, None)
+        if old:
+            _LLM_CACHE_STATE["bytes"] -= old[2]
+        _LLM_CACHE[key] = (answer, time.time() + LLM_CACHE_TTL_SEC, size)
+        _LLM_CACHE_STATE["bytes"] += size
+        _LLM_CACHE_STATS["stores"] += 1
+        while _LLM_CACHE_STATE["bytes"] > LLM_CACHE_MAX_BYTES:
+            _, (_, _, sz) = _LLM_CACHE.popitem(last=False)
+            _LLM_CACHE_STATE["bytes"] -= sz
+            _LLM_CACHE_STATS["evicted"] += 1
+
+# Single-flight: gleiche Frage (gleicher Cache-Key) bereits in Arbeit -> auf dieselbe
+# Completion warten statt eine zweite zu starten. Jeder Aufrufer antwortet selbst.
+_LLM_INFLIGHT = {}              # cache_key -> {"event": Event, "result": str|None}
+_LLM_FLIGHT_STATS = {"leaders": 0, "coalesced": 0, "leader_failed": 0}
+
+def llm_flight_begin(cache_key: str):
+    """Returns (flight, is_leader). The leader must call llm_flight_end()."""
+    with _LLM_CACHE_LOCK:
+        flight = _LLM_INFLIGHT.get(cache_key)
+        if flight is not None:
+            _LLM_FLIGHT_STATS["coalesced"] += 1
+            return flight, False
+        flight = _LLM_INFLIGHT[cache_key] = {"event": threading.Event(), "result": None}
+        _LLM_FLIGHT_STATS["leaders"] += 1
+        return flight, True
+
+def llm_flight_end(cache_key: str, flight: dict, result):
+    flight["result"] = result
+    if not result:
+        _LLM_FLIGHT_STATS["leader_failed"] += 1
+    with _LLM_CACHE_LOCK:
+        if _LLM_INFLIGHT.get(cache_key) is flight:
+            del _LLM_INFLIGHT[cache_key]
+    flight["event"].set()
+
+def llm_flight_wait(flight: dict):
+    flight["event"].wait(OPENAI_DEADLINE_SEC + 5)
+    return flight["result"]
+
+@contextmanager
+def llm_completion(cache_key: str = None, priority: int = LLM_PRIO_QUESTION, shed_answer=None):
+    """One LLM answer through cache, single-flight and admission control.
+
+    Yields a dict. If ``turn["run"]`` is False, ``turn["answer"]`` is already final: from
+    the cache, from a concurrent identical call, or ``shed_answer`` under load. Otherwise
+    the caller holds a completion slot, runs the completion and stores the result in
+    ``turn["answer"]``; on exit it is cached and handed to waiting followers (not if the
+    block raised, e.g. a cancelled stream).
+    """
+    turn = {"run": False, "answer": None, "source": None}
+    flight = None
+    if cache_key:
+        cached = llm_cache_get(cache_key)
+        if cached is not None:
+            turn.update(answer=cached, source="cache")
+            yield turn
+            return
+        for _ in range(2):
+            flight, leader = llm_flight_begin(cache_key)
+            if leader:
+                break
+            answer = llm_flight_wait(flight)
+            flight = None
+            if answer:
+                turn.update(answer=answer, source="flight")
+                yield turn
+                return
+            # Leader fehlgeschlagen -> neu anstellen (ggf. selbst Leader)
+
+    if not llm_admit(priority):
+        if flight:
+            llm_flight_end(cache_key, flight, None)
+        turn.update(answer=shed_answer, source="shed")
+        yield turn
+        return
+
+    turn.update(run=True, source="llm")
+    completed = False
+    try:
+        yield turn
+        completed = True
+    finally:
+        llm_release()
+        answer = turn["answer"] if completed else None
+        if cache_key and answer:
+            llm_cache_put(cache_key, answer)
+        if flight:
+            llm_flight_end(cache_key, flight, answer)
+
+def llm_cache_stats() -> dict:
+    with _LLM_CACHE_LOCK:
+        out = dict(_LLM_CACHE_STATS, entries=len(_LLM_CACHE), bytes=_LLM_CACHE_STATE["bytes"])
+    total = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / total, 4) if total else 0.0
+    out["single_flight"] = dict(_LLM_FLIGHT_STATS, inflight=len(_LLM_INFLIGHT))
+    return out
 
+def system_prompt_for(mode: str, channel: str) -> str:
     if mode == "cboost":
         if channel == "web":
             system_msg = """You are C-BoostAI on the official website.
@@ -1340,19 +3032,49 @@ NEVER CLAIM:
 - Never claim TBP replaces the Nexus Analyt Pro subscription.
 - Never claim users are forced to migrate from Polygon to Base.
 - Never claim Base is already live if that is not verified."""
+    return system_msg
+
+def _llm_cache_key(cache_q: str, mode: str, channel: str, system_msg: str, variant: str = None):
+    """``variant``: other stable prompt inputs the answer depends on (e.g. user notes),
+    folded into the key as a digest."""
+    norm = normalize_question(cache_q) if cache_q else ""
+    if not norm:
+        return None
+    var = hashlib.sha1(variant.encode()).hexdigest()[:12] if variant else "-"
+    return f"{mode}|{channel}|{_prompt_version(system_msg)}|{var}|{norm}"
+
+def call_openai(question: str, context, mode: str = "tbp", channel: str = "tg", cache_q: str = None,
+                priority: int = LLM_PRIO_QUESTION, shed_answer=None, cache_variant: str = None):
+    """``cache_q``: the user's raw question if the answer does not depend on the context
+    (see question_is_standalone()) and may be served from / stored in the answer cache;
+    ``cache_variant`` are further stable inputs for the key. ``priority`` is the admission
+    class; if the call is shed under load, ``shed_answer`` is returned instead."""
+    log.debug("[OPENAI] call mode=%s channel=%s model=%s", mode, channel, OPENAI_MODEL)
+
+    if not OPENAI_API_KEY:
+        log.warning("[OPENAI] OPENAI_API_KEY not set, skipping completion")
+        return None
 
-    messages = _build_messages_from_ctx(system_msg, question, context)
+    system_msg = system_prompt_for(mode, channel)
 
+    cache_key = _llm_cache_key(cache_q, mode, channel, system_msg, cache_variant)
+    with llm_completion(cache_key, priority, shed_answer) as turn:
+        if turn["run"]:
+            messages = _build_messages_from_ctx(system_msg, question, context,
+                                                budget_tokens=context_budget(channel, mode, question))
+            turn["answer"] = _complete_chat(messages, channel)
+    return turn["answer"]
+
+def _complete_chat(messages, channel: str):
     try:
         try:
-            from openai import OpenAI
-            client = OpenAI(api_key=OPENAI_API_KEY)
-            resp = client.chat.completions.create(
+            _openai_client()
+            resp = run_outbound(asyncio.wait_for(_openai_complete(
                 model=OPENAI_MODEL,
                 messages=messages,
                 temperature=0.70 if channel == "web" else 0.65,
                 max_tokens=700 if channel == "web" else 420,
-            )
+            ), OPENAI_DEADLINE_SEC), timeout=OPENAI_DEADLINE_SEC + 5)
             return resp.choices[0].message.content.strip()
         except ImportError:
             import openai
@@ -1365,9 +3087,8 @@ NEVER CLAIM:
             )
             return resp["choices"][0]["message"]["content"].strip()
     except Exception as e:
-        import traceback
-        print("OpenAI error:", repr(e))
-        traceback.print_exc()
+        _OPENAI_STATS["errors"] += 1
+        log.error("[OPENAI] completion failed: %r", e, exc_info=log.isEnabledFor(logging.DEBUG))
         return None
 
 def clean_answer(s: str) -> str:
@@ -1379,19 +3100,150 @@ def clean_answer(s: str) -> str:
         s = s[:2200].rstrip() + "…"
     return s
 
-def human_delay_for(text: str):
+_CLEAN_HOLDBACK = 20            # > längstes Rewrite-Muster ("financial advice")
+
+def clean_answer_prefix(partial: str) -> str:
+    """Part of clean_answer(partial) that further tokens can no longer change (for streaming)."""
+    s = clean_answer(partial)
+    return s[:-_CLEAN_HOLDBACK] if len(s) > _CLEAN_HOLDBACK else ""
+
+def human_delay_sec(text: str) -> float:
+    """Human-like typing delay for a reply (used with schedule_send, never slept)."""
     ln = len(text or "")
     if ln < 80:
-        time.sleep(random.uniform(0.4, 1.0))
+        return random.uniform(0.4, 1.0)
     elif ln < 220:
-        time.sleep(random.uniform(0.9, 1.6))
+        return random.uniform(0.9, 1.6)
     else:
-        time.sleep(random.uniform(1.4, 2.6))
+        return random.uniform(1.4, 2.6)
 
 # =========================
 # AUTO-POST (nur TBP)
 # =========================
 
+
+# -------------------------
+# Streaming-Antworten (Telegram): erster Satz sofort, danach gedrosselte Edits
+# -------------------------
+
+TG_STREAM_REPLIES  = os.environ.get("TG_STREAM_REPLIES", "0").strip().lower() in ("1", "true", "yes", "on")
+TG_STREAM_EDIT_SEC = float(os.environ.get("TG_STREAM_EDIT_SEC", "1.5"))    # min. Abstand zwischen Edits
+
+_FIRST_SENTENCE = re.compile(r"[.!?…](\s|$)|\n")
+_STREAM_STATS = {"streams": 0, "edits": 0, "first_text_ms_last": None, "total_ms_last": None}
+
+def stream_reply_tg(chat_id, question: str, mode: str, reply_to=None, cache_q: str = None,
+                    buttons=None, fallback: str = "", priority: int = LLM_PRIO_QUESTION, shed_answer: str = "",
+                    cache_variant: str = None):
+    """Generate and send a Telegram AI reply with streaming.
+
+    The first sentence is posted as soon as it arrives; the message is then updated via
+    editMessageText at most every TG_STREAM_EDIT_SEC until the completion is done. The
+    final text goes through clean_answer(). Call typing_start() before; the indicator is
+    released here. If admission control sheds the call, ``shed_answer`` is sent instead
+    (nothing if empty). Returns the final text.
+    """
+    token = _choose_token_for_chat(chat_id)
+    system_msg = system_prompt_for(mode, "tg")
+    cache_key = _llm_cache_key(cache_q, mode, "tg", system_msg, cache_variant)
+    kb = {"inline_keyboard": [[{"text": t, "url": u} for (t, u) in buttons]]} if buttons else None
+    t0 = time.time()
+    st = {"msg": None, "shown": "", "last_edit": 0.0, "typing": True}
+
+    def release_typing():
+        if st["typing"]:
+            st["typing"] = False
+            typing_stop(chat_id)
+
+    def send_whole(text):
+        release_typing()
+        if buttons:
+            tg_buttons(chat_id, text, buttons)
+        else:
+            tg_send(chat_id, text, reply_to=reply_to, preview=False)
+        return text
+
+    def finish(raw):
+        if raw == "":               # abgeworfen, keine Antwort
+            release_typing()
+            return ""
+        return send_whole(clean_answer(raw) if raw else fallback)
+
+    if not token or not OPENAI_API_KEY:
+        return finish(call_openai(question, [], mode=mode, channel="tg", cache_q=cache_q,
+                                  priority=priority, shed_answer=shed_answer, cache_variant=cache_variant))
+
+    def on_text(text):
+        # läuft im Outbound-Loop, darf nicht blockieren
+        now = time.time()
+        if st["msg"] is None:
+            if not _FIRST_SENTENCE.search(text):
+                return
+            shown = clean_answer(text)
+            payload = {"chat_id": chat_id, "text": shown, "disable_web_page_preview": True}
+            if reply_to:
+                payload["reply_to_message_id"] = reply_to
+            st.update(msg=tg_call(token, "sendMessage", payload), shown=shown, last_edit=now)
+            _STREAM_STATS["first_text_ms_last"] = round((now - t0) * 1000)
+            release_typing()
+            return
+        if not st["msg"].done() or now - st["last_edit"] < TG_STREAM_EDIT_SEC:
+            return
+        res = st["msg"].result() or {}
+        shown = clean_answer(text)
+        if not res.get("ok") or shown == st["shown"]:
+            return
+        st.update(shown=shown, last_edit=now)
+        _STREAM_STATS["edits"] += 1
+        tg_call(token, "editMessageText", {
+            "chat_id": chat_id,
+            "message_id": res["result"]["message_id"],
+            "text": shown,
+            "disable_web_page_preview": True,
+        })
+
+    with llm_completion(cache_key, priority, shed_answer) as turn:
+        if turn["run"]:
+            _STREAM_STATS["streams"] += 1
+            try:
+                turn["answer"] = run_outbound(asyncio.wait_for(_openai_stream(
+                    on_text,
+                    model=OPENAI_MODEL,
+                    messages=_build_messages_from_ctx(system_msg, question, []),
+                    temperature=0.65,
+                    max_tokens=420,
+                ), OPENAI_DEADLINE_SEC), timeout=OPENAI_DEADLINE_SEC + 5)
+            except Exception as e:
+                _OPENAI_STATS["errors"] += 1
+                log.error("[OPENAI] streamed completion failed: %r", e)
+            _STREAM_STATS["total_ms_last"] = round((time.time() - t0) * 1000)
+    if not turn["run"]:
+        return finish(turn["answer"])
+    raw = turn["answer"]
+    out = clean_answer(raw) if raw else fallback
+
+    if st["msg"] is None:
+        return send_whole(out)
+    try:
+        res = st["msg"].result(timeout=15) or {}
+    except Exception:
+        res = {}
+    if not res.get("ok"):
+        return send_whole(out)
+    if out != st["shown"] or kb or "<" in out:     # finaler Edit mit HTML-Parsing
+        payload = {
+            "chat_id": chat_id,
+            "message_id": res["result"]["message_id"],
+            "text": out,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": True,
+        }
+        if kb:
+            payload["reply_markup"] = kb
+        _STREAM_STATS["edits"] += 1
+        tg_call(token, "editMessageText", payload)
+    return out
+
 def autopost_needed():
     now = datetime.utcnow()
     last = MEM.get("last_autopost")
@@ -1425,21 +3277,22 @@ def autopost_text(lang="en"):
     ]
     return "\n".join(lines)
 
+def _autopost_tick(chat_id: int):
+    try:
+        if autopost_needed():
+            tg_send(chat_id, autopost_text("en"), priority=PRIO_BACKGROUND)
+            MEM["last_autopost"] = datetime.utcnow()
+    except Exception:
+        pass
+    # nächste Deadline = letzter Autopost + 10h (auch wenn der Chat-Counter gepostet hat)
+    last = MEM.get("last_autopost") or datetime.utcnow()
+    wait_sec = (last + timedelta(hours=10) - datetime.utcnow()).total_seconds()
+    sched_in(("autopost",), max(60.0, wait_sec), _autopost_tick, chat_id)
+
 def start_autopost_background(chat_id: int):
     if CBOOST_CHAT_ID and chat_id == CBOOST_CHAT_ID:
         return
-
-    def loop():
-        while True:
-            try:
-                if autopost_needed():
-                    tg_send(chat_id, autopost_text("en"))
-                    MEM["last_autopost"] = datetime.utcnow()
-            except Exception:
-                pass
-            time.sleep(60)
-
-    threading.Thread(target=loop, daemon=True).start()
+    sched_in(("autopost",), 0, _autopost_tick, chat_id)
 
 # =========================
 # BUYBOT – TBP & C-BOOST
@@ -1447,6 +3300,9 @@ def start_autopost_background(chat_id: int):
 
 CBOOST_CONTRACT = os.environ.get("CBOOST_CONTRACT", "").strip().lower()
 
+# Ab mehr als X neuen Buys pro Durchlauf -> eine Digest-Nachricht statt X Einzelposts (0 = aus)
+BUYBOT_DIGEST_BURST = int(os.environ.get("BUYBOT_DIGEST_BURST", "5") or "0")
+
 TOKEN_BUYBOT = {
     "tbp": {
         "network": "polygon_pos",
@@ -1472,7 +3328,7 @@ def fetch_pool_trades(network: str, pool_address: str, token_contract: str = "",
     url = f"https://api.geckoterminal.com/api/v2/networks/{network}/pools/{pool_address}/trades"
 
     try:
-        r = requests.get(url, timeout=8)
+        r = http_get(url)
         r.raise_for_status()
         data = r.json().get("data") or []
     except Exception as e:
@@ -1549,16 +3405,19 @@ def fetch_pool_trades(network: str, pool_address: str, token_contract: str = "",
     trades.reverse()
     return trades
 
-def send_tbp_buy_alert(chat_id: int, trade: dict, is_new: bool):
+def send_tbp_buy_alert(chat_id: int, trade: dict, is_new: bool, market: dict = None):
     usd = trade.get("usd")
     token_amount = trade.get("token_amount")
     pol_amount = trade.get("quote_amount")
     wallet = trade.get("wallet")
     tx_hash = trade.get("tx_hash")
 
-    price_now, mc_now = get_tbp_price_and_mc()
-    stats = get_market_stats() or {}
-    vol_24h = stats.get("volume_24h")
+    # market: pro Batch einmal geholt (process_buybot_for), sonst hier
+    if market is None:
+        market = get_tbp_live_data() or {}
+    price_now = market.get("price")
+    mc_now = market.get("market_cap")
+    vol_24h = market.get("volume_24h")
 
     price_txt = fmt_usd(price_now, 12) if price_now is not None else "N/A"
     mc_txt = fmt_usd(mc_now, 0) if mc_now is not None else "N/A"
@@ -1605,18 +3464,18 @@ def send_tbp_buy_alert(chat_id: int, trade: dict, is_new: bool):
     caption = "\n".join(caption_lines)
     logo = TBP_LOGO_URL
     if logo:
-        tg_send_photo(chat_id, logo, caption=caption)
+        tg_send_photo(chat_id, logo, caption=caption, priority=PRIO_ALERT)
     else:
-        tg_send(chat_id, caption, preview=True)
+        tg_send(chat_id, caption, preview=True, priority=PRIO_ALERT)
 
-def send_cboost_buy_alert(chat_id: int, trade: dict, is_new: bool):
+def send_cboost_buy_alert(chat_id: int, trade: dict, is_new: bool, market: dict = None):
     usd = trade.get("usd")
     token_amount = trade.get("token_amount")
     pol_amount = trade.get("quote_amount")
     wallet = trade.get("wallet")
     tx_hash = trade.get("tx_hash")
 
-    data = get_cboost_live_data() or {}
+    data = market if market is not None else (get_cboost_live_data() or {})
     price_now = data.get("price")
     mc_now = data.get("market_cap")
     vol_now = data.get("volume_24h")
@@ -1666,9 +3525,56 @@ def send_cboost_buy_alert(chat_id: int, trade: dict, is_new: bool):
     caption = "\n".join(caption_lines)
     logo = CBOOST_LOGO_URL
     if logo:
-        tg_send_photo(chat_id, logo, caption=caption)
+        tg_send_photo(chat_id, logo, caption=caption, priority=PRIO_ALERT)
+    else:
+        tg_send(chat_id, caption, preview=True, priority=PRIO_ALERT)
+
+def get_buybot_market(token_key: str) -> dict:
+    if token_key == "tbp":
+        return get_tbp_live_data() or {}
+    return get_cboost_live_data() or {}
+
+def send_buy_digest(token_key: str, chat_id: int, buys: list, market: dict):
+    """One summary post for a burst of buys: count, total USD, biggest buy, new holders."""
+    cfg = TOKEN_BUYBOT.get(token_key) or {}
+    symbol = cfg.get("symbol", token_key.upper())
+    is_tbp = token_key == "tbp"
+
+    total_usd = sum((tr.get("usd") or 0) for tr, _ in buys)
+    new_holders = sum(1 for _, is_new in buys if is_new)
+    biggest = max((tr for tr, _ in buys), key=lambda tr: tr.get("usd") or 0)
+
+    price_now = market.get("price")
+    mc_now = market.get("market_cap")
+    vol_now = market.get("volume_24h")
+    chart_url = market.get("chart_url") or (LINKS["dexscreener"] if is_tbp else None)
+
+    caption_lines = [
+        f"{'🐸' if is_tbp else '⚡'} <b>{symbol} Buy Burst – {len(buys)} new buys</b>\n",
+        f"💰 <b>Total:</b> {fmt_usd(total_usd, 2)}",
+        f"🏆 <b>Biggest:</b> {fmt_usd(biggest.get('usd'), 2) if biggest.get('usd') is not None else 'N/A'}"
+        + (f" (<code>{_short_addr(biggest.get('wallet'))}</code>)" if biggest.get("wallet") else ""),
+        f"🆕 <b>New holders:</b> {new_holders}",
+        "",
+        f"💵 <b>Price (after):</b> {fmt_usd(price_now, 12 if is_tbp else 10) if price_now is not None else 'N/A'}",
+        f"🏦 <b>Market Cap:</b> {fmt_usd(mc_now, 0 if is_tbp else 2) if mc_now is not None else 'N/A'}",
+        f"📊 <b>24h Volume:</b> {fmt_usd(vol_now, 2) if vol_now is not None else 'N/A'}",
+    ]
+
+    if biggest.get("tx_hash"):
+        caption_lines.append(
+            f"🔗 <a href=\"https://polygonscan.com/tx/{biggest['tx_hash']}\">Biggest buy on PolygonScan</a>"
+        )
+
+    if chart_url:
+        caption_lines.append(f"\n📈 <a href=\"{chart_url}\">Open Live Chart</a>")
+
+    caption = "\n".join(caption_lines)
+    logo = cfg.get("logo_url")
+    if logo:
+        tg_send_photo(chat_id, logo, caption=caption, priority=PRIO_ALERT)
     else:
-        tg_send(chat_id, caption, preview=True)
+        tg_send(chat_id, caption, preview=True, priority=PRIO_ALERT)
 
 def process_buybot_for(token_key: str, chat_id: int):
     cfg = TOKEN_BUYBOT.get(token_key)
@@ -1703,6 +3609,7 @@ def process_buybot_for(token_key: str, chat_id: int):
     if not new_trades:
         return
 
+    buys = []
     for tr in new_trades:
         side = (tr.get("side") or "").lower()
         if "buy" not in side:
@@ -1719,27 +3626,47 @@ def process_buybot_for(token_key: str, chat_id: int):
             known.add(wallet)
             is_new = True
 
+        buys.append((tr, is_new))
+
+    state["last_hash"] = hashes[-1]
+    if not buys:
+        return
+
+    # Marktdaten einmal pro Batch, nicht pro Trade
+    market = get_buybot_market(token_key)
+
+    if BUYBOT_DIGEST_BURST > 0 and len(buys) > BUYBOT_DIGEST_BURST:
+        send_buy_digest(token_key, chat_id, buys, market)
+        return
+
+    for tr, is_new in buys:
         if token_key == "tbp":
-            send_tbp_buy_alert(chat_id, tr, is_new)
+            send_tbp_buy_alert(chat_id, tr, is_new, market=market)
         else:
-            send_cboost_buy_alert(chat_id, tr, is_new)
+            send_cboost_buy_alert(chat_id, tr, is_new, market=market)
 
-    state["last_hash"] = hashes[-1]
+BUYBOT_INTERVAL_SEC = float(os.environ.get("BUYBOT_INTERVAL_SEC", "25"))
 
-def start_buybot_background():
-    def loop():
-        while True:
-            try:
-                tbp_chat = MEM.get("tbp_chat_id")
-                if tbp_chat:
-                    process_buybot_for("tbp", tbp_chat)
-                if CBOOST_CHAT_ID:
-                    process_buybot_for("cboost", CBOOST_CHAT_ID)
-            except Exception as e:
-                print(f"[BUYBOT] loop error: {e}")
-            time.sleep(25)
+def buybot_chat_for(token_key: str):
+    if token_key == "tbp":
+        return MEM.get("tbp_chat_id")
+    if token_key == "cboost":
+        return CBOOST_CHAT_ID or None
+    return None
+
+def _buybot_tick(token_key: str):
+    try:
+        chat_id = buybot_chat_for(token_key)
+        if chat_id:
+            process_buybot_for(token_key, chat_id)
+    except Exception as e:
+        print(f"[BUYBOT] {token_key} tick error: {e}")
+    sched_in(("buybot", token_key), jittered(BUYBOT_INTERVAL_SEC), _buybot_tick, token_key)
 
-    threading.Thread(target=loop, daemon=True).start()
+def start_buybot_background():
+    # eigener Tick pro Token, mit Jitter -> keine synchronen Bursts gegen GeckoTerminal
+    for token_key in TOKEN_BUYBOT:
+        sched_in(("buybot", token_key), jittered(2.0, 0.5), _buybot_tick, token_key)
 
 # =========================
 # IDLE WATCHDOG – lebendiger Chat
@@ -1758,37 +3685,47 @@ IDLE_MESSAGES_CBOOST = [
     "Drop a meme or ask me something 😏⚡",
 ]
 
-def start_idle_watchdog_background():
-    def loop():
-        while True:
-            try:
-                now = datetime.utcnow()
-                last_activity = MEM.get("last_activity", {})
-                last_idle = MEM.get("last_idle", {})
+IDLE_AFTER_SEC  = 600          # Chat so lange still -> Idle-Nachricht
+IDLE_REPEAT_SEC = 3600         # höchstens eine Idle-Nachricht pro Stunde
 
-                for chat_id, last in list(last_activity.items()):
-                    if not chat_id or not isinstance(last, datetime):
-                        continue
+def _idle_check(chat_id):
+    """Runs at a chat's idle deadline; re-arms itself at the next possible deadline."""
+    now = datetime.utcnow()
+    last = MEM.get("last_activity", {}).get(chat_id)
+    if not chat_id or not isinstance(last, datetime):
+        return
 
-                    diff = (now - last).total_seconds()
-                    prev_idle_time = last_idle.get(chat_id)
-                    idle_diff = (now - prev_idle_time).total_seconds() if prev_idle_time else 999999
+    diff = (now - last).total_seconds()
+    if diff < IDLE_AFTER_SEC:
+        sched_in(("idle", chat_id), IDLE_AFTER_SEC - diff, _idle_check, chat_id)
+        return
 
-                    if diff > 600 and idle_diff > 3600:
-                        if CBOOST_CHAT_ID and chat_id == CBOOST_CHAT_ID:
-                            msg = random.choice(IDLE_MESSAGES_CBOOST)
-                        else:
-                            msg = random.choice(IDLE_MESSAGES_TBP)
+    prev_idle_time = MEM.get("last_idle", {}).get(chat_id)
+    idle_diff = (now - prev_idle_time).total_seconds() if prev_idle_time else 999999
+    if idle_diff < IDLE_REPEAT_SEC:
+        sched_in(("idle", chat_id), IDLE_REPEAT_SEC - idle_diff, _idle_check, chat_id)
+        return
 
-                        tg_send(chat_id, msg)
-                        MEM["last_idle"][chat_id] = now
+    if CBOOST_CHAT_ID and chat_id == CBOOST_CHAT_ID:
+        msg = random.choice(IDLE_MESSAGES_CBOOST)
+    else:
+        msg = random.choice(IDLE_MESSAGES_TBP)
 
-            except Exception as e:
-                print("[IDLE] loop error:", e)
+    tg_send(chat_id, msg, priority=PRIO_BACKGROUND)
+    MEM["last_idle"][chat_id] = now
+    sched_in(("idle", chat_id), IDLE_REPEAT_SEC, _idle_check, chat_id)
 
-            time.sleep(30)
+def note_chat_activity(chat_id):
+    """Record activity; arm the chat's idle deadline if none is pending.
+    (Deadline wird nicht bei jeder Nachricht verschoben, _idle_check prüft neu.)"""
+    MEM["last_activity"][chat_id] = datetime.utcnow()
+    if MEM.get("_idle_started") and not sched_pending(("idle", chat_id)):
+        sched_in(("idle", chat_id), IDLE_AFTER_SEC, _idle_check, chat_id)
 
-    threading.Thread(target=loop, daemon=True).start()
+def start_idle_watchdog_background():
+    for chat_id in list(MEM.get("last_activity", {})):
+        if chat_id and not sched_pending(("idle", chat_id)):
+            sched_in(("idle", chat_id), 0, _idle_check, chat_id)
 
 # =========================
 # FLASK WEB (health/ask/admin)
@@ -1814,14 +3751,16 @@ def admin_set_webhook():
     tokens = [t for t in [TELEGRAM_TOKEN_TBP, TELEGRAM_TOKEN_CBOOST] if t]
     if not tokens:
         return jsonify({"ok": False, "error": "no telegram tokens configured"}), 500
+    if TG_INGEST_MODE == "polling":
+        return jsonify({"ok": False, "error": "TG_INGEST_MODE=polling, webhook would stop getUpdates"}), 409
 
     results = []
     try:
         for tok in tokens:
-            r = requests.get(
+            # eigener Pfad pro Bot -> eingehende Updates lernen die Chat-Route
+            r = http_get(
                 f"https://api.telegram.org/bot{tok}/setWebhook",
-                params={"url": url},
-                timeout=10
+                params={"url": f"{url}/{tok.split(':')[0]}"},
             )
             results.append(r.json())
     except Exception as e:
@@ -1829,18 +3768,54 @@ def admin_set_webhook():
 
     return jsonify({"ok": True, "responses": results})
 
-# Web-AI für TBP-Webseite (Option A: ChatGPT style)
-@app.route("/ask", methods=["POST"])
-def ask():
-    data = request.json or {}
-    q = (data.get("question") or "").strip()
-    if not q:
-        return jsonify({"answer": "empty question"}), 200
+@app.route("/admin/providers")
+def admin_providers():
+    key = request.args.get("key", "")
+    if not ADMIN_SECRET or key != ADMIN_SECRET:
+        return jsonify({"ok": False, "error": "unauthorized"}), 403
+    return jsonify({"ok": True, "providers": provider_health()})
+
+@app.route("/admin/metrics")
+def admin_metrics():
+    key = request.args.get("key", "")
+    if not ADMIN_SECRET or key != ADMIN_SECRET:
+        return jsonify({"ok": False, "error": "unauthorized"}), 403
+    return jsonify({
+        "ok": True,
+        "scheduler": scheduler_stats(),
+        "outbound": {"inflight": _OUTBOUND["inflight"], "calls": _OUTBOUND["calls"]},
+        "telegram": tg_queue_stats(),
+        "coalesce": dict(_COALESCE_STATS),
+        "routes": dict(_ROUTE_STATS, chats=len(_CHAT_ROUTES)),
+        "file_ids": dict(_FILE_ID_STATS, cached=len(_FILE_IDS)),
+        "ingest": dict(_POLL_STATS, mode=TG_INGEST_MODE),
+        "dedup": dedup_stats(),
+        "llm_cache": llm_cache_stats(),
+        "llm_admission": llm_admission_stats(),
+        "openai": dict(_OPENAI_STATS),
+        "prompt": dict(_PROMPT_STATS, tokenizer="tiktoken" if _TOKENIZER is not None else "estimate"),
+        "streaming": dict(_STREAM_STATS, enabled=TG_STREAM_REPLIES),
+        "typing": dict(_TYPING_STATS, active=sum(1 for st in list(_TYPING.values()) if st["refs"] > 0)),
+    })
 
+def _web_question(q: str, mode: str):
+    """Prepare a website question: (lang, direct_answer, llm_question). Exactly one of
+    direct_answer / llm_question is set."""
     lang = "de" if is_de(q) else "en"
 
+    if mode == "cboost":
+        kr = knowledge_router(q, lang, is_cboost_chat=True, allow_links=False)
+        hint = ""
+        if kr:
+            hint = (
+                "\n\nUse the following quick info if helpful, but do NOT copy-paste as a template:\n"
+                f"{kr}\n"
+            )
+        return lang, None, q + hint
+
     # Price shortcut stays fast
     if WORD_PRICE.search(q):
+        ensure_market_refresher()
         p = get_live_price()
         stats = get_market_stats() or {}
         lines = []
@@ -1852,56 +3827,176 @@ def ask():
             lines.append("💧 " + say(lang, "Liquidität", "Liquidity") + f": {fmt_usd(stats['liquidity_usd'])}")
         if stats.get("volume_24h") not in (None, "", "null"):
             lines.append(f"🔄 Vol 24h: {fmt_usd(stats['volume_24h'])}")
-        ans = "\n".join(lines) if lines else say(lang, "Preis derzeit nicht verfügbar.", "Price currently unavailable.")
-    else:
-        # IMPORTANT FIX: Knowledge router is ONLY a helper hint for web, not a hard override
-        kr = knowledge_router(q, lang, is_cboost_chat=False, allow_links=True)
-        hint = ""
-        if kr:
-            hint = (
-                "\n\nUse the following quick project facts if helpful, but do NOT copy-paste as a template. "
-                "Answer naturally and adapt to the question:\n"
-                f"{kr}\n"
-            )
+        if lines and stats.get("as_of"):
+            lines.append(market_asof_line(stats, lang))
+        return lang, "\n".join(lines) if lines else say(lang, "Preis derzeit nicht verfügbar.", "Price currently unavailable."), None
 
-        raw = call_openai(q + hint, MEM["ctx"], mode="tbp", channel="web") \
-              or say(lang, "Netzwerkfehler. Versuch’s nochmal 🐸", "Network glitch. Try again 🐸")
-        ans = clean_answer(raw)
+    # IMPORTANT FIX: Knowledge router is ONLY a helper hint for web, not a hard override
+    kr = knowledge_router(q, lang, is_cboost_chat=False, allow_links=True)
+    hint = ""
+    if kr:
+        hint = (
+            "\n\nUse the following quick project facts if helpful, but do NOT copy-paste as a template. "
+            "Answer naturally and adapt to the question:\n"
+            f"{kr}\n"
+        )
+    return lang, None, q + hint
 
+def _web_fallback(lang: str, mode: str) -> str:
+    if mode == "cboost":
+        return "Network glitch. Try again ⚡"
+    return say(lang, "Netzwerkfehler. Versuch’s nochmal 🐸", "Network glitch. Try again 🐸")
+
+def _web_shed_answer(q: str, lang: str, mode: str) -> str:
+    """Canned answer when the LLM queue is overloaded: knowledge router / FAQ, else a busy note."""
+    cb = mode == "cboost"
+    canned = knowledge_router(q, lang, is_cboost_chat=cb, allow_links=not cb) or faq_reply(q, lang, cb)
+    if canned:
+        return canned
+    if cb:
+        return "Lots of questions right now. Try again in a moment ⚡"
+    return say(lang, "Gerade ist viel los. Frag gleich nochmal 🐸", "Lots of questions right now. Try again in a moment 🐸")
+
+def _web_cache_q(q: str, ctx) -> str:
+    return q if question_is_standalone(q, ctx, answer_prefixes=("TBP: ", "C-Boost: ")) else None
+
+def _web_remember(q: str, ans: str, mode: str):
     MEM["ctx"].append(f"You: {q}")
-    MEM["ctx"].append(f"TBP: {ans}")
+    MEM["ctx"].append(f"{'C-Boost' if mode == 'cboost' else 'TBP'}: {ans}")
     MEM["ctx"] = MEM["ctx"][-14:]
-    return jsonify({"answer": ans})
 
-# Web-AI für C-Boost Website (Option A)
-@app.route("/ask_cboost", methods=["POST"])
-def ask_cboost():
+def _web_ask(mode: str):
     data = request.json or {}
     q = (data.get("question") or "").strip()
     if not q:
         return jsonify({"answer": "empty question"}), 200
 
-    lang = "de" if is_de(q) else "en"
+    lang, ans, llm_q = _web_question(q, mode)
+    if ans is None:
+        ctx = list(MEM["ctx"])
+        raw = call_openai(llm_q, ctx, mode=mode, channel="web", cache_q=_web_cache_q(q, ctx),
+                          shed_answer=_web_shed_answer(q, lang, mode)) or _web_fallback(lang, mode)
+        ans = clean_answer(raw)
 
-    kr = knowledge_router(q, lang, is_cboost_chat=True, allow_links=False)
-    hint = ""
-    if kr:
-        hint = (
-            "\n\nUse the following quick info if helpful, but do NOT copy-paste as a template:\n"
-            f"{kr}\n"
-        )
+    _web_remember(q, ans, mode)
+    return jsonify({"answer": ans})
 
-    raw = call_openai(q + hint, MEM["ctx"], mode="cboost", channel="web") or "Network glitch. Try again ⚡"
-    ans = clean_answer(raw)
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    MEM["ctx"].append(f"You: {q}")
-    MEM["ctx"].append(f"C-Boost: {ans}")
-    MEM["ctx"] = MEM["ctx"][-14:]
-    return jsonify({"answer": ans})
+def _web_ask_stream(mode: str):
+    """SSE variant: ``delta`` events with cleaned text pieces, then one ``done`` event
+    carrying the full answer (server-side context is updated at that point). The deltas
+    always concatenate to exactly the ``done`` answer."""
+    data = request.json or {}
+    q = (data.get("question") or "").strip()
+    if not q:
+        return Response(_sse("done", {"answer": "empty question"}), mimetype="text/event-stream")
+
+    lang, direct, llm_q = _web_question(q, mode)
+    ctx = list(MEM["ctx"])
+
+    def generate():
+        ans, emitted, partial, raw = direct, "", "", None
+        if ans is None:
+            if OPENAI_API_KEY:
+                system_msg = system_prompt_for(mode, "web")
+                cache_key = _llm_cache_key(_web_cache_q(q, ctx), mode, "web", system_msg)
+                with llm_completion(cache_key, LLM_PRIO_QUESTION, _web_shed_answer(q, lang, mode)) as turn:
+                    if turn["run"]:
+                        chunks = queue.Queue()
+                        fut = outbound_submit(asyncio.wait_for(_openai_stream(
+                            chunks.put,
+                            model=OPENAI_MODEL,
+                            messages=_build_messages_from_ctx(system_msg, llm_q, ctx,
+                                                              budget_tokens=context_budget("web", mode, llm_q)),
+                            temperature=0.70,
+                            max_tokens=700,
+                        ), OPENAI_DEADLINE_SEC))
+                        fut.add_done_callback(lambda f: chunks.put(None))
+                        try:
+                            while True:
+                                text = chunks.get(timeout=OPENAI_DEADLINE_SEC + 5)
+                                if text is None:
+                                    break
+                                partial = text
+                                piece = clean_answer_prefix(text)
+                                if len(piece) > len(emitted) and piece.startswith(emitted):
+                                    yield _sse("delta", {"text": piece[len(emitted):]})
+                                    emitted = piece
+                            turn["answer"] = fut.result(0)
+                        except Exception as e:
+                            _OPENAI_STATS["errors"] += 1
+                            log.error("[OPENAI] streamed web completion failed: %r", e)
+                        finally:
+                            fut.cancel()    # Browser weg / Fehler -> Completion abbrechen
+                # Abbruch nach den ersten Deltas -> mit dem Gestreamten abschließen (nicht gecacht)
+                raw = turn["answer"] or (partial if emitted else None)
+            ans = clean_answer(raw) if raw else _web_fallback(lang, mode)
+            if not ans.startswith(emitted):
+                ans = emitted           # Deltas ergeben immer genau die done-Antwort
+            if len(ans) > len(emitted):
+                yield _sse("delta", {"text": ans[len(emitted):]})
+        else:
+            yield _sse("delta", {"text": ans})
+
+        _web_remember(q, ans, mode)
+        yield _sse("done", {"answer": ans})
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Web-AI für TBP-Webseite (Option A: ChatGPT style)
+@app.route("/ask", methods=["POST"])
+def ask():
+    return _web_ask("tbp")
+
+@app.route("/ask_stream", methods=["POST"])
+def ask_stream():
+    return _web_ask_stream("tbp")
+
+# Web-AI für C-Boost Website (Option A)
+@app.route("/ask_cboost", methods=["POST"])
+def ask_cboost():
+    return _web_ask("cboost")
+
+@app.route("/ask_cboost_stream", methods=["POST"])
+def ask_cboost_stream():
+    return _web_ask_stream("cboost")
+
+# TBP price history (lokal, ohne Upstream-Call)
+@app.route("/tbp_history", methods=["GET"])
+def tbp_history():
+    tier = (request.args.get("tier") or "15m").strip()
+    if tier != "raw" and tier not in HISTORY_TIERS:
+        return jsonify({"ok": False, "error": "unknown tier", "tiers": ["raw"] + list(HISTORY_TIERS)}), 400
+    try:
+        hours = max(0.0, min(float(request.args.get("hours") or 24), 24 * 30))
+    except Exception:
+        hours = 24.0
+
+    s = history_series(tier, time.time() - hours * 3600)
+    cols = ["ts", "price", "liq", "vol"] if tier == "raw" else list(_TIER_COLS)
+    points = [list(row) for row in zip(*(s.get(c, []) for c in cols))]
+
+    hi, lo = history_high_low(hours * 3600)
+    return jsonify({
+        "ok": True,
+        "tier": tier,
+        "columns": cols,
+        "points": points,
+        "change_1h": history_change(3600),
+        "change_6h": history_change(6 * 3600),
+        "change_24h": history_change(86400),
+        "change_7d": history_change(7 * 86400),
+        "high": hi,
+        "low": lo,
+    })
 
 # C-Boost PRICE API
 @app.route("/cboost_price", methods=["GET"])
 def cboost_price():
+    ensure_market_refresher()
     data = get_cboost_live_data()
     if not data:
         return jsonify({"ok": False, "error": "no_data"}), 200
@@ -1911,7 +4006,9 @@ def cboost_price():
         "price":      data["price"],
         "market_cap": data["market_cap"],
         "volume_24h": data["volume_24h"],
-        "chart_url":  data["chart_url"]
+        "chart_url":  data["chart_url"],
+        "as_of":      data.get("as_of"),
+        "stale":      data.get("stale", False),
     })
 
 # =========================
@@ -1961,12 +4058,281 @@ def handle_extra_commands(text, chat_id, lang, is_cboost_chat, msg_id=None):
 
     return False
 
+# -------------------------
+# Ingest: Webhook quittiert sofort, Verarbeitung über Mailboxen pro Chat
+# -------------------------
+
+# Jeder Chat hat eine Mailbox (FIFO). Ein Chat wird immer nur von einem Worker
+# abgearbeitet -> Reihenfolge bleibt, verschiedene Chats laufen parallel. Nach
+# TG_MAILBOX_BATCH Updates stellt sich der Chat hinten an, damit wenige Chats mit
+# LLM-Antworten nicht alle Worker blockieren.
+TG_WORKERS       = int(os.environ.get("TG_WORKERS", "8"))
+TG_MAILBOX_MAX   = int(os.environ.get("TG_MAILBOX_MAX", "200"))
+TG_MAILBOX_BATCH = int(os.environ.get("TG_MAILBOX_BATCH", "1"))
+
+_TG_POOL = ThreadPoolExecutor(max_workers=TG_WORKERS, thread_name_prefix="tg")
+_MAILBOX_LOCK = threading.Lock()
+_MAILBOXES = {}                 # chat_id -> deque[update]
+_MAILBOX_ACTIVE = set()         # chat_ids, die gerade ein Worker abarbeitet
+
+# Verzögerte Sends (Human-Delay) werden auf dem Outbound-Loop terminiert statt
+# Threads schlafen zu lassen; pro Chat bleiben sie in Reihenfolge. Abgearbeitet
+# werden sie in einem eigenen kleinen Pool (nur Enqueue in die Telegram-Queue),
+# damit fällige Sends nicht hinter LLM-Aufrufen im Mailbox-Pool warten.
+_SEND_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tg-send")
+_SEND_LOCK = threading.Lock()
+_CHAT_SENDS = {}                # chat_id -> deque[(due_ts, fn, args, kwargs, typing)]
+_CHAT_SEND_LOCKS = {}           # chat_id -> Lock (serialisiert das Abarbeiten)
+
+# Dedup (bot, update_id): Telegram liefert Updates erneut, wenn die Antwort zu spät kam.
+# Exakter LRU-Ring für die letzten N Updates + zwei rotierende Bloom-Filter für den
+# Rest des Fensters (FP-Rate bei Default-Größe << 1e-4). Duplikate werden verworfen,
+# bevor irgendwas verarbeitet wird.
+UPDATE_DEDUP_MAX        = int(os.environ.get("UPDATE_DEDUP_MAX", "20000"))
+UPDATE_DEDUP_WINDOW_SEC = float(os.environ.get("UPDATE_DEDUP_WINDOW_SEC", "86400"))
+UPDATE_BLOOM_BITS       = int(os.environ.get("UPDATE_BLOOM_BITS", str(1 << 21)))    # pro Generation, 256 KB
+UPDATE_BLOOM_HASHES     = int(os.environ.get("UPDATE_BLOOM_HASHES", "12"))
+
+_DEDUP_LOCK = threading.Lock()
+_DEDUP_RING = OrderedDict()     # "bot:update_id" -> ts
+_DEDUP_BLOOM = {
+    "cur": bytearray(UPDATE_BLOOM_BITS // 8),
+    "prev": bytearray(UPDATE_BLOOM_BITS // 8),
+    "rotated": time.time(),
+}
+_DEDUP_STATS = {"seen": 0, "duplicates": 0, "bloom_hits": 0}
+
+def _bloom_positions(key: str):
+    h = hashlib.blake2b(key.encode(), digest_size=16).digest()
+    a = int.from_bytes(h[:8], "little")
+    b = int.from_bytes(h[8:], "little") | 1
+    n = len(_DEDUP_BLOOM["cur"]) * 8
+    return [(a + i * b) % n for i in range(UPDATE_BLOOM_HASHES)]
+
+def _bloom_has(bits: bytearray, positions) -> bool:
+    return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+def is_duplicate_update(update: dict, token: str = None) -> bool:
+    uid = update.get("update_id")
+    if uid is None:
+        return False
+    key = f"{token.split(':')[0] if token else '-'}:{uid}"
+    positions = _bloom_positions(key)
+    now = time.time()
+    with _DEDUP_LOCK:
+        _DEDUP_STATS["seen"] += 1
+        if now - _DEDUP_BLOOM["rotated"] > UPDATE_DEDUP_WINDOW_SEC / 2:
+            _DEDUP_BLOOM["prev"] = _DEDUP_BLOOM["cur"]
+            _DEDUP_BLOOM["cur"] = bytearray(len(_DEDUP_BLOOM["prev"]))
+            _DEDUP_BLOOM["rotated"] = now
+
+        ts = _DEDUP_RING.get(key)
+        if ts is not None and now - ts < UPDATE_DEDUP_WINDOW_SEC:
+            _DEDUP_STATS["duplicates"] += 1
+            return True
+        if ts is None and (_bloom_has(_DEDUP_BLOOM["cur"], positions) or _bloom_has(_DEDUP_BLOOM["prev"], positions)):
+            _DEDUP_STATS["duplicates"] += 1
+            _DEDUP_STATS["bloom_hits"] += 1
+            return True
+
+        _DEDUP_RING[key] = now
+        _DEDUP_RING.move_to_end(key)
+        while len(_DEDUP_RING) > UPDATE_DEDUP_MAX:
+            _DEDUP_RING.popitem(last=False)
+        cur = _DEDUP_BLOOM["cur"]
+        for p in positions:
+            cur[p >> 3] |= 1 << (p & 7)
+        return False
+
+def dedup_stats() -> dict:
+    with _DEDUP_LOCK:
+        out = dict(_DEDUP_STATS, ring=len(_DEDUP_RING))
+    out["duplicate_rate"] = round(out["duplicates"] / out["seen"], 4) if out["seen"] else 0.0
+    return out
+
+def _update_chat_id(update: dict):
+    msg = update.get("message", {}) or {}
+    return (msg.get("chat", {}) or {}).get("id")
+
+def enqueue_update(update: dict, token: str = None):
+    if is_duplicate_update(update, token):
+        return
+    chat_id = _update_chat_id(update)
+    if token:
+        learn_chat_route(chat_id, token)
+    with _MAILBOX_LOCK:
+        box = _MAILBOXES.setdefault(chat_id, deque())
+        if len(box) >= TG_MAILBOX_MAX:
+            box.popleft()
+            print(f"[TG] mailbox full for chat {chat_id}, dropped oldest update")
+        box.append(update)
+        if chat_id in _MAILBOX_ACTIVE:
+            return
+        _MAILBOX_ACTIVE.add(chat_id)
+    _TG_POOL.submit(_drain_mailbox, chat_id)
+
+def _drain_mailbox(chat_id):
+    for _ in range(max(1, TG_MAILBOX_BATCH)):
+        with _MAILBOX_LOCK:
+            box = _MAILBOXES.get(chat_id)
+            if not box:
+                _MAILBOXES.pop(chat_id, None)
+                _MAILBOX_ACTIVE.discard(chat_id)
+                return
+            update = box.popleft()
+        try:
+            handle_update(update)
+        except Exception as e:
+            print(f"[TG] handle_update error (chat {chat_id}): {e}")
+    # Batch voll -> hinten anstellen (Chat bleibt aktiv, Reihenfolge bleibt)
+    _TG_POOL.submit(_drain_mailbox, chat_id)
+
+def schedule_send(chat_id, delay: float, fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` after ``delay`` seconds without blocking a thread.
+    Sends for the same chat keep their scheduling order. Immediate replies
+    (/commands, moderation notices) go through here with ``delay=0``, so they
+    never overtake a delayed AI reply scheduled earlier for that chat."""
+    _schedule_chat_send(chat_id, delay, fn, args, kwargs, False)
+
+def schedule_reply(chat_id, delay: float, fn, *args, **kwargs):
+    """Like schedule_send, but for a reply started with typing_start(): the typing
+    indicator is released once the reply is handed to the send queue."""
+    _schedule_chat_send(chat_id, delay, fn, args, kwargs, True)
+
+def _schedule_chat_send(chat_id, delay: float, fn, args, kwargs, typing: bool):
+    with _SEND_LOCK:
+        q = _CHAT_SENDS.setdefault(chat_id, deque())
+        due = time.time() + max(0.0, delay)
+        if q:
+            due = max(due, q[-1][0] + 0.3)
+        q.append((due, fn, args, kwargs, typing))
+        _CHAT_SEND_LOCKS.setdefault(chat_id, threading.Lock())
+
+    loop = outbound_loop()
+    loop.call_soon_threadsafe(
+        lambda: loop.call_later(max(0.0, due - time.time()), _SEND_POOL.submit, _flush_chat_sends, chat_id)
+    )
+
+def _flush_chat_sends(chat_id):
+    with _SEND_LOCK:
+        lock = _CHAT_SEND_LOCKS.get(chat_id)
+    if lock is None:
+        return
+    with lock:
+        while True:
+            with _SEND_LOCK:
+                if _CHAT_SEND_LOCKS.get(chat_id) is not lock:
+                    return          # Queue wurde geleert und neu angelegt, hat eigene Flushes
+                q = _CHAT_SENDS.get(chat_id)
+                if not q:
+                    _CHAT_SENDS.pop(chat_id, None)
+                    _CHAT_SEND_LOCKS.pop(chat_id, None)
+                    return
+                if q[0][0] > time.time() + 0.01:
+                    return
+                _, fn, args, kwargs, typing = q.popleft()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"[TG] scheduled send error (chat {chat_id}): {e}")
+            if typing:
+                typing_stop(chat_id)
+
 @app.route("/telegram", methods=["GET", "POST"])
-def telegram_webhook():
+@app.route("/telegram/<bot_id>", methods=["GET", "POST"])
+def telegram_webhook(bot_id=None):
     if request.method == "GET":
         return jsonify({"ok": True, "route": "telegram"}), 200
 
-    update  = request.json or {}
+    update = request.get_json(silent=True) or {}
+    enqueue_update(update, token=_BOT_TOKENS.get(bot_id))
+    return jsonify({"ok": True})
+
+# -------------------------
+# Ingest: getUpdates Long-Polling (Alternative zum Webhook, kein Inbound nötig)
+# -------------------------
+
+# TG_INGEST_MODE=polling: pro Bot-Token eine Long-Poll-Coroutine auf dem Outbound-Loop,
+# limit=100 pro Batch, Offset persistiert. Beide Bots pollen parallel, jedes Update
+# läuft über enqueue_update() wie beim Webhook. Nur EIN Prozess darf pollen.
+TG_INGEST_MODE   = os.environ.get("TG_INGEST_MODE", "webhook").strip().lower()
+TG_POLL_TIMEOUT  = int(os.environ.get("TG_POLL_TIMEOUT", "50"))
+TG_OFFSETS_FILE  = os.environ.get("TG_OFFSETS_FILE", "tg_offsets.json").strip()
+
+_TG_OFFSETS = {}                # bot_id -> nächster update_id
+_POLL_STATS = {"batches": 0, "updates": 0, "max_batch": 0, "errors": 0}
+
+def _load_offsets():
+    if not TG_OFFSETS_FILE or not os.path.exists(TG_OFFSETS_FILE):
+        return
+    try:
+        with open(TG_OFFSETS_FILE, "r", encoding="utf-8") as f:
+            _TG_OFFSETS.update({str(k): int(v) for k, v in json.load(f).items()})
+    except Exception as e:
+        print(f"[POLL] offsets load failed ({TG_OFFSETS_FILE}): {e}")
+
+def _save_offsets():
+    try:
+        tmp = TG_OFFSETS_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(_TG_OFFSETS), f)
+        os.replace(tmp, TG_OFFSETS_FILE)
+    except Exception as e:
+        print(f"[POLL] offsets save failed ({TG_OFFSETS_FILE}): {e}")
+
+async def _poll_updates(token: str):
+    bot_id = token.split(":")[0]
+    base = f"https://api.telegram.org/bot{token}"
+    try:
+        # getUpdates liefert 409, solange ein Webhook gesetzt ist
+        await ahttp_request("POST", f"{base}/deleteWebhook", json={"drop_pending_updates": False})
+    except Exception as e:
+        print(f"[POLL] deleteWebhook failed for bot {bot_id}: {e}")
+
+    backoff = 1.0
+    while True:
+        try:
+            r = await ahttp_request("GET", f"{base}/getUpdates", params={
+                "offset": _TG_OFFSETS.get(bot_id, 0),
+                "limit": 100,
+                "timeout": TG_POLL_TIMEOUT,
+                "allowed_updates": json.dumps(["message"]),
+            }, timeout=(3.05, TG_POLL_TIMEOUT + 10))
+            data = r.json()
+            if not data.get("ok"):
+                raise RuntimeError(data.get("description") or f"HTTP {r.status_code}")
+            updates = data.get("result") or []
+            backoff = 1.0
+        except Exception as e:
+            _POLL_STATS["errors"] += 1
+            print(f"[POLL] getUpdates failed for bot {bot_id}: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+            continue
+
+        if not updates:
+            continue
+        for update in updates:
+            enqueue_update(update, token=token)
+        _TG_OFFSETS[bot_id] = int(updates[-1]["update_id"]) + 1
+        _POLL_STATS["batches"] += 1
+        _POLL_STATS["updates"] += len(updates)
+        _POLL_STATS["max_batch"] = max(_POLL_STATS["max_batch"], len(updates))
+        if TG_OFFSETS_FILE and not sched_pending(("offsets_save",)):
+            sched_in(("offsets_save",), 2, _save_offsets)
+
+def start_polling_ingest() -> bool:
+    if MEM.get("_polling_started") or not _BOT_TOKENS:
+        return False
+    MEM["_polling_started"] = True
+    _load_offsets()
+    for token in _BOT_TOKENS.values():
+        outbound_submit(_poll_updates(token))
+    print(f"[POLL] long-polling {len(_BOT_TOKENS)} bot(s), timeout={TG_POLL_TIMEOUT}s")
+    return True
+
+def handle_update(update: dict):
+    """Full reply pipeline for one Telegram update (runs on a mailbox worker)."""
     msg     = update.get("message", {}) or {}
     chat    = msg.get("chat", {}) or {}
     chat_id = chat.get("id")
@@ -1990,15 +4356,17 @@ def telegram_webhook():
         replied_to_bot = False
 
     if not chat_id:
-        return jsonify({"ok": True})
+        return
+
+    preupload_photos()
 
     try:
-        MEM["last_activity"][chat_id] = datetime.utcnow()
+        note_chat_activity(chat_id)
     except Exception:
         pass
 
     if text and re.fullmatch(r"[?\.\!]+", text):
-        return jsonify({"ok": True})
+        return
 
     is_cboost_chat = bool(CBOOST_CHAT_ID and chat_id == CBOOST_CHAT_ID)
 
@@ -2013,29 +4381,10 @@ def telegram_webhook():
             fn = member.get("first_name") or ""
             un = member.get("username")
             display = f"@{un}" if un else fn or "friend"
-
-            if is_cboost_chat:
-                welcome_text = (
-                    f"👋 Welcome {display} to the official C-Boost community!\n\n"
-                    "AI security is ON:\n"
-                    "• No paid listing offers\n"
-                    "• No promo for other projects\n"
-                    "Use /rules for details ⚡"
-                )
-            else:
-                welcome_text = (
-                    f"👋 Welcome {display} to the official TurboPepe-AI (TBP) community!\n\n"
-                    "AI security is ON:\n"
-                    "• No paid listing offers\n"
-                    "• No promo for other projects\n\n"
-                    "🪙 TBP-AI NFTs LIVE: Gold ($60) / Silver ($30)\n"
-                    f"Mint: {LINKS['nfts']}\n\n"
-                    "Use /rules for details 🐸"
-                )
-            tg_send(chat_id, welcome_text)
+            queue_welcome(chat_id, display, is_cboost_chat)
 
         if not text:
-            return jsonify({"ok": True})
+            return
 
     try:
         if MEM.get("_autopost_started") != True and not is_cboost_chat:
@@ -2058,14 +4407,19 @@ def telegram_webhook():
     except Exception:
         pass
 
+    try:
+        ensure_market_refresher()
+    except Exception:
+        pass
+
     if "photo" in msg:
         caption = random.choice(MEME_CAPTIONS_CBOOST if is_cboost_chat else MEME_CAPTIONS_TBP)
-        tg_send(chat_id, caption, reply_to=msg_id)
+        schedule_send(chat_id, 0, tg_send, chat_id, caption, reply_to=msg_id)
         MEM["chat_count"] += 1
-        return jsonify({"ok": True})
+        return
 
     if not text:
-        return jsonify({"ok": True})
+        return
 
     low  = text.lower()
     lang = "de" if is_de(text) else "en"
@@ -2074,7 +4428,8 @@ def telegram_webhook():
     # Commands
     if low.startswith("/start"):
         if is_cboost_chat:
-            tg_send(
+            schedule_send(
+                chat_id, 0, tg_send,
                 chat_id,
                 say(
                     lang,
@@ -2084,20 +4439,21 @@ def telegram_webhook():
                 reply_to=msg_id
             )
         else:
-            tg_buttons(
+            schedule_send(
+                chat_id, 0, tg_buttons,
                 chat_id,
                 say(lang, f"Hi, ich bin {BOT_NAME}. Frag was zu TBP 🐸", f"Hi, I'm {BOT_NAME}. Ask about TBP 🐸"),
                 [("Sushi", LINKS["buy"]), ("Chart", LINKS["dexscreener"]), ("Scan", LINKS["contract_scan"])]
             )
-        return jsonify({"ok": True})
+        return
 
     if low.startswith("/help"):
-        tg_send(chat_id, "/price • /stats • /chart • /links • /nfts • /rules • /security • /id • /about • /dev", reply_to=msg_id, preview=False)
-        return jsonify({"ok": True})
+        schedule_send(chat_id, 0, tg_send, chat_id, "/price • /stats • /chart • /links • /nfts • /rules • /security • /id • /about • /dev", reply_to=msg_id, preview=False)
+        return
 
     if low.startswith("/about") or low.startswith("/dev"):
         if handle_extra_commands(text, chat_id, lang, is_cboost_chat, msg_id):
-            return jsonify({"ok": True})
+            return
 
     if low.startswith("/rules") or low.startswith("/security"):
         if is_cboost_chat:
@@ -2116,38 +4472,39 @@ def telegram_webhook():
                 "• Only official TBP links allowed 🐸\n\n"
                 "🇩🇪 Kurz:\n• Keine bezahlten Listings\n• Keine Fremd-Promo\n"
             )
-        tg_send(chat_id, rules_text, reply_to=msg_id)
-        return jsonify({"ok": True})
+        schedule_send(chat_id, 0, tg_send, chat_id, rules_text, reply_to=msg_id)
+        return
 
     if low.startswith("/id"):
-        tg_send_any(chat_id, f"Chat ID: <code>{chat_id}</code>", reply_to=msg_id, preview=False)
-        return jsonify({"ok": True})
+        schedule_send(chat_id, 0, tg_send, chat_id, f"Chat ID: <code>{chat_id}</code>", reply_to=msg_id, preview=False)
+        return
 
     if low.startswith("/links"):
         if is_cboost_chat:
-            tg_send(chat_id, say(lang,
+            schedule_send(chat_id, 0, tg_send, chat_id, say(lang,
                 "⚡ C-Boost: nutze /price und /chart für Live-Daten. Mehr Links folgen später.",
                 "⚡ C-Boost: use /price and /chart for live data. More links later."
             ), reply_to=msg_id)
-            return jsonify({"ok": True})
+            return
 
-        tg_buttons(
+        schedule_send(
+            chat_id, 0, tg_buttons,
             chat_id,
             say(lang, "🔗 TBP Quick Links:", "🔗 TBP Quick Links:"),
             [("Sushi", LINKS["buy"]), ("Chart", LINKS["dexscreener"]), ("Scan", LINKS["contract_scan"]), ("Website", LINKS["website"]), ("NFTs", LINKS["nfts"])]
         )
-        return jsonify({"ok": True})
+        return
 
     # PRICE / STATS / CHART
     if low.startswith("/price") or (not low.startswith("/") and WORD_PRICE.search(low)):
         if is_cboost_chat:
             data = get_cboost_live_data()
             if not data:
-                tg_send(chat_id, say(lang,
+                schedule_send(chat_id, 0, tg_send, chat_id, say(lang,
                     "⚠️ C-Boost Live-Daten gerade nicht verfügbar.",
                     "⚠️ C-Boost live data not available right now."
                 ), reply_to=msg_id)
-                return jsonify({"ok": True})
+                return
 
             price = data.get("price")
             mc    = data.get("market_cap")
@@ -2159,19 +4516,20 @@ def telegram_webhook():
                 f"🪙 <b>Price:</b> {fmt_usd(price, 10) if price is not None else 'N/A'}",
                 f"💰 <b>Market Cap:</b> {fmt_usd(mc, 2) if mc is not None else 'N/A'}",
                 f"📊 <b>24h Volume:</b> {fmt_usd(vol, 2) if vol is not None else 'N/A'}",
+                market_asof_line(data, lang),
                 f"\n📈 <a href=\"{chart}\">Open Live Chart</a>" if chart else ""
             ]).strip()
 
-            tg_send_photo(chat_id, CBOOST_LOGO_URL, caption=caption, reply_to=msg_id)
-            return jsonify({"ok": True})
+            schedule_send(chat_id, 0, tg_send_photo, chat_id, CBOOST_LOGO_URL, caption=caption, reply_to=msg_id)
+            return
 
         data = get_tbp_live_data()
         if not data:
-            tg_send(chat_id, say(lang,
+            schedule_send(chat_id, 0, tg_send, chat_id, say(lang,
                 "⚠️ TBP Live-Daten gerade nicht verfügbar.",
                 "⚠️ TBP live data not available right now."
             ), reply_to=msg_id)
-            return jsonify({"ok": True})
+            return
 
         price = data.get("price")
         mc    = data.get("market_cap")
@@ -2190,6 +4548,8 @@ def telegram_webhook():
 
         if chg is not None:
             caption_lines.append(f"📈 <b>24h Change:</b> {float(chg):.2f}%")
+        if data.get("as_of"):
+            caption_lines.append(market_asof_line(data, lang))
 
         caption_lines.extend([
             "",
@@ -2204,20 +4564,20 @@ def telegram_webhook():
         caption = "\n".join(caption_lines).strip()
 
         if TBP_LOGO_URL:
-            tg_send_photo(chat_id, TBP_LOGO_URL, caption=caption, reply_to=msg_id)
+            schedule_send(chat_id, 0, tg_send_photo, chat_id, TBP_LOGO_URL, caption=caption, reply_to=msg_id)
         else:
-            tg_send(chat_id, caption, reply_to=msg_id, preview=True)
-        return jsonify({"ok": True})
+            schedule_send(chat_id, 0, tg_send, chat_id, caption, reply_to=msg_id, preview=True)
+        return
 
     if low.startswith("/stats"):
         if is_cboost_chat:
             data = get_cboost_live_data()
             if not data:
-                tg_send(chat_id, say(lang,
+                schedule_send(chat_id, 0, tg_send, chat_id, say(lang,
                     "C-Boost Stats gerade nicht verfügbar.",
                     "C-Boost stats not available right now."
                 ), reply_to=msg_id)
-                return jsonify({"ok": True})
+                return
 
             lines = [
                 "⚡ C-Boost Stats:",
@@ -2225,16 +4585,18 @@ def telegram_webhook():
                 f"• Market Cap: {fmt_usd(data.get('market_cap'), 2) if data.get('market_cap') is not None else 'N/A'}",
                 f"• Vol 24h: {fmt_usd(data.get('volume_24h'), 2) if data.get('volume_24h') is not None else 'N/A'}",
             ]
-            tg_send(chat_id, "\n".join(lines), reply_to=msg_id)
-            return jsonify({"ok": True})
+            if data.get("as_of"):
+                lines.append(market_asof_line(data, lang))
+            schedule_send(chat_id, 0, tg_send, chat_id, "\n".join(lines), reply_to=msg_id)
+            return
 
         data = get_tbp_live_data()
         if not data:
-            tg_send(chat_id, say(lang,
+            schedule_send(chat_id, 0, tg_send, chat_id, say(lang,
                 "TBP Stats gerade nicht verfügbar.",
                 "TBP stats not available right now."
             ), reply_to=msg_id)
-            return jsonify({"ok": True})
+            return
 
         lines = [say(lang, "TBP-Stats:", "TBP Stats:")]
         if data.get("change_24h") is not None:
@@ -2246,29 +4608,41 @@ def telegram_webhook():
         if data.get("market_cap") is not None:
             lines.append(f"• MC: {fmt_usd(data['market_cap'])}")
 
-        tg_send(chat_id, "\n".join(lines), reply_to=msg_id)
-        return jsonify({"ok": True})
+        # Lokale Historie (kein Upstream-Call)
+        for label, sec in (("1h", 3600), ("6h", 6 * 3600), ("7d", 7 * 86400)):
+            chg = history_change(sec)
+            if chg is not None:
+                lines.append(f"• {label}: {chg:.2f}%")
+        hi, lo = history_high_low(86400)
+        if hi is not None:
+            lines.append(f"• 24h High/Low: {fmt_usd(hi, 12)} / {fmt_usd(lo, 12)}")
+
+        if data.get("as_of"):
+            lines.append(market_asof_line(data, lang))
+
+        schedule_send(chat_id, 0, tg_send, chat_id, "\n".join(lines), reply_to=msg_id)
+        return
 
     if low.startswith("/chart"):
         if is_cboost_chat:
             data = get_cboost_live_data()
             chart = data.get("chart_url") if data else None
-            tg_send(chat_id, say(lang,
+            schedule_send(chat_id, 0, tg_send, chat_id, say(lang,
                 f"📊 C-Boost Chart:\n{chart}" if chart else "Chart gerade nicht verfügbar.",
                 f"📊 C-Boost chart:\n{chart}" if chart else "Chart not available right now."
             ), reply_to=msg_id)
-            return jsonify({"ok": True})
+            return
 
-        tg_buttons(chat_id, say(lang, "📊 TBP Live-Chart:", "📊 TBP live chart:"), [("DexScreener", LINKS["dexscreener"]), ("DEXTools", LINKS["dextools"])])
-        return jsonify({"ok": True})
+        schedule_send(chat_id, 0, tg_buttons, chat_id, say(lang, "📊 TBP Live-Chart:", "📊 TBP live chart:"), [("DexScreener", LINKS["dexscreener"]), ("DEXTools", LINKS["dextools"])])
+        return
 
     if text.strip().lower() == "raid.":
-        tg_send(chat_id, say(lang, "🚀 RAID! TBP army bereit! 🐸", "🚀 RAID! TBP army ready! 🐸"), reply_to=msg_id)
-        return jsonify({"ok": True})
+        schedule_send(chat_id, 0, tg_send, chat_id, say(lang, "🚀 RAID! TBP army bereit! 🐸", "🚀 RAID! TBP army ready! 🐸"), reply_to=msg_id)
+        return
 
     try:
         if MEM["chat_count"] >= 25 and not is_cboost_chat:
-            tg_send(chat_id, autopost_text("en"))
+            schedule_send(chat_id, 0, tg_send, chat_id, autopost_text("en"), priority=PRIO_BACKGROUND)
             MEM["chat_count"] = 0
             MEM["last_autopost"] = datetime.utcnow()
     except Exception:
@@ -2279,78 +4653,79 @@ def telegram_webhook():
         if is_illegal_offer(low):
             tg_delete_message(chat_id, msg_id)
             strike = add_strike(chat_id, user_id)
-            tg_send(chat_id, say(lang,
+            moderation_notice(chat_id, lang, "illegal", say(lang,
                 f"⚠️ Illegale Angebote sind hier verboten. (Strike {strike}/3)",
                 f"⚠️ Illegal offers are forbidden here. (Strike {strike}/3)"
             ))
-            return jsonify({"ok": True})
+            return
 
         if is_listing_scam(low):
             tg_delete_message(chat_id, msg_id)
             strike = add_strike(chat_id, user_id)
-            tg_send(chat_id, say(lang,
+            moderation_notice(chat_id, lang, "listing", say(lang,
                 f"⚠️ Bezahlte Listings/Fast-Track sind hier nicht erlaubt. (Strike {strike}/3)",
                 f"⚠️ Paid listing/fast-track offers are not allowed here. (Strike {strike}/3)"
             ))
-            return jsonify({"ok": True})
+            return
 
         if is_external_promo(low):
             tg_delete_message(chat_id, msg_id)
             strike = add_strike(chat_id, user_id)
-            tg_send(chat_id, say(lang,
+            moderation_notice(chat_id, lang, "promo", say(lang,
                 f"⚠️ Externe Promo für andere Projekte ist hier nicht erlaubt. (Strike {strike}/3)",
                 f"⚠️ External promo for other projects is not allowed here. (Strike {strike}/3)"
             ))
-            return jsonify({"ok": True})
+            return
 
     # OPTION D: Knowledge router (Telegram only) BEFORE old NFT block
     if not low.startswith("/"):
         kr = knowledge_router(text, lang, is_cboost_chat, allow_links=True)
         if kr:
-            tg_typing(chat_id)
-            time.sleep(random.uniform(0.6, 1.4))
+            typing_start(chat_id)
+            delay = random.uniform(0.6, 1.4)
             if (not is_cboost_chat) and _user_wants_links(text):
-                tg_buttons(
+                schedule_reply(
+                    chat_id, delay, tg_buttons,
                     chat_id,
                     kr,
                     [("NFTs", LINKS["nfts"]), ("Chart", LINKS["dexscreener"]), ("Sushi", LINKS["buy"]), ("Scan", LINKS["contract_scan"])]
                 )
             else:
-                tg_send(chat_id, kr, reply_to=msg_id, preview=False)
+                schedule_reply(chat_id, delay, tg_send, chat_id, kr, reply_to=msg_id, preview=False)
             if WORD_NFT.search(low):
                 note_user(chat_id, user_id or 0, "interested_nfts")
-            return jsonify({"ok": True})
+            return
 
     # FAST FAQ SHORTCUTS
     if not low.startswith("/"):
         fast = faq_reply(text, lang, is_cboost_chat)
         if fast:
-            tg_typing(chat_id)
-            human_delay_for(fast)
-            tg_send(chat_id, fast, reply_to=msg_id, preview=True)
+            typing_start(chat_id)
+            schedule_reply(chat_id, human_delay_sec(fast), tg_send, chat_id, fast, reply_to=msg_id, preview=True)
             if WORD_NFT.search(low):
                 note_user(chat_id, user_id or 0, "interested_nfts")
             if WORD_PRICE.search(low):
                 note_user(chat_id, user_id or 0, "asks_price")
-            return jsonify({"ok": True})
+            return
     # SMART CONFIRM / CORRECT (3C) — TBP only, anti-spam
     if not low.startswith("/") and not replied_to_bot and (not is_cboost_chat):
         si = maybe_smart_interject(chat_id, text, lang)
         if si:
-            tg_typing(chat_id)
-            time.sleep(random.uniform(0.4, 1.0))
-            tg_send(chat_id, si, reply_to=msg_id, preview=False)
-            return jsonify({"ok": True})
+            typing_start(chat_id)
+            schedule_reply(chat_id, random.uniform(0.4, 1.0), tg_send, chat_id, si, reply_to=msg_id, preview=False)
+            return
 
     # SMART INTERJECTION (Conversation Watcher)
     if not low.startswith("/") and not replied_to_bot:
-        if should_interject(chat_id, is_cboost_chat):
+        # Einwürfe sind optional -> unter Last gar nicht erst versuchen
+        if should_interject(chat_id, is_cboost_chat) and not llm_shedding(LLM_PRIO_INTERJECT):
             topic = MEM["chat_topic"].get(chat_id, "chat")
             MEM["last_interject"][chat_id] = datetime.utcnow()
 
-            ctx = build_chat_context_block(chat_id)
+            mode = "cboost" if is_cboost_chat else "tbp"
             notes = get_user_notes(chat_id, user_id or 0)
             note_txt = f"User notes: {', '.join(notes)}" if notes else "User notes: none"
+            ctx = build_chat_context_block(chat_id, budget_tokens=context_budget("tg", mode, note_txt))
 
             interject_q = (
                 "You are joining an ongoing Telegram group conversation.\n"
@@ -2364,24 +4739,26 @@ def telegram_webhook():
                 "Now write your message."
             )
 
-            tg_typing(chat_id)
-            time.sleep(random.uniform(0.7, 1.6))
-            mode = "cboost" if is_cboost_chat else "tbp"
-            raw = call_openai(interject_q, [], mode=mode, channel="tg")
+            typing_start(chat_id)
+            t0, pre_delay = time.time(), random.uniform(0.7, 1.6)
+            raw = call_openai(interject_q, [], mode=mode, channel="tg", priority=LLM_PRIO_INTERJECT, shed_answer="")
+            if raw == "":
+                typing_stop(chat_id)
+                return
             out = clean_answer(raw) if raw else say(lang, "kurz: ich bin da 👀", "quick: I'm here 👀")
-            tg_send(chat_id, out, reply_to=msg_id, preview=False)
-            return jsonify({"ok": True})
+            schedule_reply(chat_id, pre_delay - (time.time() - t0), tg_send, chat_id, out, reply_to=msg_id, preview=False)
+            return
 
     # NORMAL AI REPLY (Selective, Human)
     if not low.startswith("/"):
         if not should_reply(chat_id, text, is_cboost_chat, replied_to_bot=replied_to_bot):
-            return jsonify({"ok": True})
+            return
 
     mode = "cboost" if is_cboost_chat else "tbp"
 
-    ctx = build_chat_context_block(chat_id)
     notes = get_user_notes(chat_id, user_id or 0)
     note_txt = f"User notes: {', '.join(notes)}" if notes else "User notes: none"
+    ctx = build_chat_context_block(chat_id, budget_tokens=context_budget("tg", mode, note_txt, text))
 
     enriched_q = (
         "Answer as a Telegram community member.\n"
@@ -2398,33 +4775,49 @@ def telegram_webhook():
         f"{text}"
     )
 
-    tg_typing(chat_id)
-    time.sleep(random.uniform(0.4, 1.2))
-
-    raw = call_openai(enriched_q, [], mode=mode, channel="tg")
-    if not raw:
-        raw = say(lang, "Netzwerkfehler. Versuch’s nochmal 🐸", "Network glitch. Try again 🐸")
-
-    out = clean_answer(raw)
-
+    typing_start(chat_id)
+    t0, pre_delay = time.time(), random.uniform(0.4, 1.2)
+    # Antworten auf Bot-Replies hängen am Verlauf -> nicht cachen; sonst nur, wenn die
+    # Frage nichts mit den Kontextzeilen im Prompt zu tun hat (Key inkl. User-Notes)
+    standalone = not replied_to_bot and question_is_standalone(text, ctx.split("\n"))
+    cache_q = text if standalone else None
+    fallback = say(lang, "Netzwerkfehler. Versuch’s nochmal 🐸", "Network glitch. Try again 🐸")
+    # Unter Last: Replies auf den Bot bekommen notfalls einen Hinweis, direkte Fragen
+    # bleiben unbeantwortet (Knowledge-Router/FAQ haben oben schon nichts gefunden)
+    prio = LLM_PRIO_REPLY if replied_to_bot else LLM_PRIO_QUESTION
+    shed_answer = say(lang, "Gerade ist viel los. Frag mich gleich nochmal 🐸",
+                      "Lots going on right now. Ask me again in a moment 🐸") if replied_to_bot else ""
     wants_links = bool(re.search(r"\b(link|links|buy|kaufen|chart|scan|website)\b", low))
-    if wants_links and mode == "tbp":
-        human_delay_for(out)
-        tg_buttons(
-            chat_id,
-            out,
-            [("Sushi", LINKS["buy"]), ("Chart", LINKS["dexscreener"]), ("Scan", LINKS["contract_scan"]), ("NFTs", LINKS["nfts"])]
-        )
+    link_buttons = [("Sushi", LINKS["buy"]), ("Chart", LINKS["dexscreener"]), ("Scan", LINKS["contract_scan"]), ("NFTs", LINKS["nfts"])]
+
+    if TG_STREAM_REPLIES:
+        stream_reply_tg(chat_id, enriched_q, mode, reply_to=msg_id, cache_q=cache_q,
+                        buttons=link_buttons if (wants_links and mode == "tbp") else None, fallback=fallback,
+                        priority=prio, shed_answer=shed_answer, cache_variant=note_txt)
     else:
-        human_delay_for(out)
-        tg_send(chat_id, out, reply_to=msg_id, preview=False)
+        raw = call_openai(enriched_q, [], mode=mode, channel="tg", cache_q=cache_q,
+                          priority=prio, shed_answer=shed_answer, cache_variant=note_txt)
+        if raw == "":               # abgeworfen
+            typing_stop(chat_id)
+        else:
+            out = clean_answer(raw or fallback)
+
+            # Pre-Delay läuft parallel zur Generierung, danach Human-Delay als geplanter Send
+            delay = max(0.0, pre_delay - (time.time() - t0)) + human_delay_sec(out)
+            if wants_links and mode == "tbp":
+                schedule_reply(chat_id, delay, tg_buttons, chat_id, out, link_buttons)
+            else:
+                schedule_reply(chat_id, delay, tg_send, chat_id, out, reply_to=msg_id, preview=False)
 
     if WORD_NFT.search(low):
         note_user(chat_id, user_id or 0, "interested_nfts")
     if WORD_PRICE.search(low):
         note_user(chat_id, user_id or 0, "asks_price")
 
-    return jsonify({"ok": True})
+    return
+
+if TG_INGEST_MODE == "polling":
+    start_polling_ingest()
 
 # =========================
 # MAIN
@@ -2433,4 +4826,6 @@ def telegram_webhook():
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 10000))
     print(f"[{BOT_NAME}] starting on :{port}")
+    ensure_market_refresher()
+    preupload_photos()
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,48 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest  # noqa: E402
+
+# Fake-Upstreams aus dem Loadtest; server.py liest die Config beim Import -> ENV vorher setzen
+FAKES = {name: loadtest.FakeUpstream(name, loadtest._load_payloads("")) for name in loadtest.SERVICES}
+FAKES["openai"].token_delay = 0.0
+
+os.environ.update({
+    "HTTP_HOST_OVERRIDE": json.dumps({
+        "api.telegram.org": FAKES["telegram"].url,
+        "api.dexscreener.com": FAKES["dexscreener"].url,
+        "api.geckoterminal.com": FAKES["gecko"].url,
+        "api.openai.com": FAKES["openai"].url,
+    }),
+    "TELEGRAM_BOT_TOKEN": "1000001:test-tbp",
+    "OPENAI_API_KEY": "sk-test",
+    "TG_INGEST_MODE": "webhook",
+    "TG_STREAM_REPLIES": "0",
+    "TG_ROUTES_FILE": "",
+    "TG_FILE_ID_FILE": "",
+    "TG_OFFSETS_FILE": "",
+    "PRICE_HISTORY_FILE": "",
+})
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def openai_fake():
+    FAKES["openai"].reset()
+    return FAKES["openai"]
+
+
+@pytest.fixture
+def client():
+    server.MEM["ctx"] = []
+    with server._LLM_CACHE_LOCK:
+        server._LLM_CACHE.clear()
+        server._LLM_CACHE_STATE["bytes"] = 0
+    return server.app.test_client()
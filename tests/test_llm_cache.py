@@ -0,0 +1,18 @@
+import server
+
+
+def test_repeated_web_question_is_cache_hit(client, openai_fake):
+    answers = [client.post("/ask", json={"question": "what is tbp?"}).get_json()["answer"] for _ in range(4)]
+
+    assert len(set(answers)) == 1
+    assert openai_fake.calls["chat.completions"] == 1
+    assert len(server.MEM["ctx"]) == 8          # Kontext wächst weiter, Key bleibt stabil
+
+
+def test_followup_question_is_not_cached():
+    ctx = ["You: how do i buy tbp on sushi?", "TBP: Swap POL for TBP on SushiSwap."]
+
+    assert not server.question_is_standalone("where can i buy it?", ctx)
+    assert not server.question_is_standalone("is sushi safe?", ctx)
+    assert server.question_is_standalone("how do i buy tbp on sushi?", ctx, answer_prefixes=("TBP: ",))
+    assert server.question_is_standalone("who is the dev?", ctx)
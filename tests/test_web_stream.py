@@ -0,0 +1,34 @@
+import json
+
+import server
+
+
+def _events(body: bytes):
+    out = []
+    for block in body.decode().strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def _ask_stream(client, question):
+    events = _events(client.post("/ask_stream", json={"question": question}).data)
+    deltas = "".join(d["text"] for ev, d in events if ev == "delta")
+    done = [d["answer"] for ev, d in events if ev == "done"]
+    return events, deltas, done
+
+
+def test_stream_deltas_concatenate_to_done(client, openai_fake, monkeypatch):
+    answer = "TBP is no financial advice token but a live AI ecosystem on Polygon. Nexus Analyt is live."
+    monkeypatch.setitem(openai_fake.payloads["openai_chat"]["choices"][0]["message"], "content", answer)
+
+    events, deltas, done = _ask_stream(client, "what is tbp?")
+
+    assert sum(1 for ev, _ in events if ev == "delta") > 1      # wirklich gestreamt
+    assert done == [server.clean_answer(answer)]
+    assert deltas == done[0]
+
+    # zweiter Aufruf kommt aus dem Cache, gleiche Invariante
+    _, deltas, done = _ask_stream(client, "What is TBP")
+    assert openai_fake.calls["chat.completions"] == 1
+    assert deltas == done[0] == server.clean_answer(answer)